@@ -0,0 +1,48 @@
+import io
+import sys
+import time
+from tinyabc.archive import Archive
+from tinyabc.writer import ArchiveWriter
+
+
+def _build_archive(num_objects, num_properties):
+    handle = io.BytesIO()
+    writer = ArchiveWriter(handle)
+    for i in range(num_objects):
+        path = "/Object{}".format(i)
+        writer.add_object(path, schema="AbcGeom_Xform_v3")
+        writer.add_compound(path, ".xform", metadata={"schema": "AbcGeom_Xform_v3"})
+        for j in range(num_properties):
+            writer.add_property(path, ".xform/prop{}".format(j), "d", extent=3)
+            writer.write_sample(path, ".xform/prop{}".format(j), [(i, j, 0)])
+    writer.close()
+    return handle.getvalue()
+
+
+def _parse(blob):
+    archive = Archive.from_buffer(blob)
+    count = 0
+    for path in archive.paths():
+        count += len(archive[path].properties[".xform"].children)
+    return count
+
+
+def main():
+    num_objects = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    num_properties = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    blob = _build_archive(num_objects, num_properties)
+
+    rounds = 5
+    start = time.perf_counter()
+    for _ in range(rounds):
+        count = _parse(blob)
+    elapsed = (time.perf_counter() - start) / rounds
+    print(
+        "{} objects, {} property headers: {:.3f} ms ({:.3f} us/header)".format(
+            num_objects, count, elapsed * 1000, elapsed * 1000000 / count
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import struct
+import time
+from tinyabc.archive import Archive
+from tinyabc.ogawa import Ogawa
+
+SCHEMA = b"schema=AbcGeom_Xform_v3"
+
+
+def build_flat_archive(num_objects):
+    # every object has a .xform compound holding a single int8 scalar property
+    prop_info = 1 | (2 << 4) | (1 << 12)
+    prop_headers = struct.pack("<IBB", prop_info, 1, 7) + b"visible"
+    compound_headers = struct.pack("<IB", 0, 6) + b".xform"
+    sample = bytes(16) + b"\x01"
+    leaf = [[[[sample], prop_headers], compound_headers], bytes(32)]
+
+    children = []
+    headers = b""
+    for i in range(num_objects):
+        name = "object_{:06d}".format(i).encode("utf8")
+        headers += struct.pack("<I", len(name)) + name + b"\x01"
+        children.append(list(leaf))
+
+    tree = [
+        struct.pack("<I", 0),
+        struct.pack("<I", 10808),
+        [[]] + children + [headers + bytes(32)],
+        b"_ai_Application=tinyabc",
+        struct.pack("<IdId", 0, 1.0, 1, 0.0),
+        struct.pack("<B", len(SCHEMA)) + SCHEMA,
+    ]
+    return bytes(Ogawa.from_tree(tree).serialize())
+
+
+def main():
+    print("{:>10} {:>12} {:>14}".format("objects", "size (KB)", "lookup (ms)"))
+    for num_objects in (1000, 10000, 50000):
+        blob = build_flat_archive(num_objects)
+        path = "/object_{:06d}".format(num_objects // 2)
+        start = time.perf_counter()
+        archive = Archive.from_buffer(blob)
+        archive[path].properties[".xform"]["visible"].get_sample(0)
+        elapsed = time.perf_counter() - start
+        print(
+            "{:>10} {:>12} {:>14.3f}".format(
+                num_objects, len(blob) // 1024, elapsed * 1000
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
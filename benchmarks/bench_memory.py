@@ -0,0 +1,75 @@
+import io
+import struct
+import sys
+import tracemalloc
+from tinyabc.ogawa import Ogawa, OgawaWriter
+
+
+class DictGroup(Ogawa.Group):
+    # subclasses without __slots__ get a per instance __dict__ again
+    pass
+
+
+class DictData(Ogawa.Data):
+    pass
+
+
+def _build_archive(num_nodes):
+    handle = io.BytesIO()
+    writer = OgawaWriter(handle)
+    headers = [writer.write_data(struct.pack("<Q", i)) for i in range(num_nodes)]
+    writer.close([writer.write_group(headers)])
+    return handle.getvalue()
+
+
+def _measure(func):
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    result = func()
+    used = tracemalloc.get_traced_memory()[0] - start
+    tracemalloc.stop()
+    return used, result
+
+
+def main():
+    num_nodes = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    ogawa = Ogawa(_build_archive(num_nodes))
+    group = ogawa.root.get_group(0)
+
+    def _header_list():
+        return [
+            struct.unpack("<Q", ogawa.read(group.offset + 8 + (8 * i), 8))[0]
+            for i in range(num_nodes)
+        ]
+
+    def _header_array():
+        return group._get_headers()
+
+    def _nodes(data_class):
+        def _build():
+            nodes = [data_class(ogawa, header & 0x7FFFFFFFFFFFFFFF) for header in table]
+            for node in nodes:
+                node.size
+            return nodes
+
+        return _build
+
+    table = group._get_headers()
+
+    print("{:<30} {:>15} {:>15}".format("", "total (KB)", "bytes/node"))
+    for name, func in (
+        ("header table (list)", _header_list),
+        ("header table (array)", _header_array),
+        ("data nodes (__dict__)", _nodes(DictData)),
+        ("data nodes (__slots__)", _nodes(Ogawa.Data)),
+        ("groups (__dict__)", lambda: [DictGroup(ogawa, 0) for _ in table]),
+        ("groups (__slots__)", lambda: [Ogawa.Group(ogawa, 0) for _ in table]),
+    ):
+        group._headers = None
+        used, result = _measure(func)
+        print("{:<30} {:>15} {:>15.1f}".format(name, used // 1024, used / num_nodes))
+        del result
+
+
+if __name__ == "__main__":
+    main()
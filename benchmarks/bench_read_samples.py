@@ -0,0 +1,50 @@
+import io
+import sys
+import time
+from tinyabc.archive import Archive
+from tinyabc.writer import ArchiveWriter
+
+
+def _build_archive(num_frames, num_points):
+    import numpy
+
+    handle = io.BytesIO()
+    writer = ArchiveWriter(handle)
+    writer.add_object("/Mesh")
+    writer.add_property("/Mesh", "P", "f", extent=3)
+    points = numpy.zeros((num_points, 3), dtype=numpy.float32)
+    for frame in range(num_frames):
+        writer.write_sample("/Mesh", "P", points + frame)
+    writer.close()
+    return handle.getvalue()
+
+
+def _measure(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def main():
+    import numpy
+
+    num_points = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    print("{:>10} {:>15} {:>15}".format("frames", "bulk (s)", "loop (s)"))
+    for num_frames in (2000, 4000, 8000, 16000):
+        blob = _build_archive(num_frames, num_points)
+
+        # every measurement gets its own archive, so no sample cache is shared
+        def _get_property():
+            return Archive.from_buffer(blob)["/Mesh"].properties["P"]
+
+        prop = _get_property()
+        bulk = _measure(prop.read_samples)
+        prop = _get_property()
+        loop = _measure(
+            lambda: numpy.stack([prop.get_decoded_sample(i) for i in range(num_frames)])
+        )
+        print("{:>10} {:>15.3f} {:>15.3f}".format(num_frames, bulk, loop))
+
+
+if __name__ == "__main__":
+    main()
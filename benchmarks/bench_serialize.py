@@ -0,0 +1,40 @@
+import glob
+import os.path
+import time
+from tinyabc.ogawa import Ogawa
+
+FIXTURES = os.path.join(
+    os.path.dirname(__file__), "..", "tinyabc", "tests", "fixtures", "*.abc"
+)
+
+
+def _serialize(ogawa, optimize, rounds=20):
+    start = time.perf_counter()
+    for _ in range(0, rounds):
+        blob = ogawa.serialize(optimize=optimize)
+    return len(blob), (time.perf_counter() - start) / rounds
+
+
+def main():
+    print(
+        "{:<45} {:>10} {:>10} {:>10} {:>10}".format(
+            "fixture", "size", "optimized", "ms", "opt ms"
+        )
+    )
+    for filename in sorted(glob.glob(FIXTURES)):
+        ogawa = Ogawa.from_filename(filename)
+        size, elapsed = _serialize(ogawa, False)
+        optimized_size, optimized_elapsed = _serialize(ogawa, True)
+        print(
+            "{:<45} {:>10} {:>10} {:>10.3f} {:>10.3f}".format(
+                os.path.basename(filename),
+                size,
+                optimized_size,
+                elapsed * 1000,
+                optimized_elapsed * 1000,
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+from collections import deque
+import asyncio
+import functools
+from .archive import Archive, get_frame_indices
+from .encoders import numpy_property
+from .properties import CompoundProperty
+
+
+async def _aiter_prefetched(func, indices, prefetch):
+    # at most prefetch items are scheduled ahead of the consumer
+    pending = deque()
+    try:
+        for _index in indices:
+            pending.append(asyncio.ensure_future(func(_index)))
+            if len(pending) > prefetch:
+                yield await pending.popleft()
+        while pending:
+            yield await pending.popleft()
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+class AsyncArchive:
+    def __init__(self, archive, executor=None, max_concurrency=None):
+        self.archive = archive
+        self.executor = executor
+        self._semaphore = (
+            asyncio.Semaphore(max_concurrency) if max_concurrency else None
+        )
+        # (property, true index, encoder) -> decode in flight
+        self._pending = {}
+        self.root = AsyncObject(self, archive.root)
+
+    @staticmethod
+    async def open(filename, executor=None, max_concurrency=None, use_mmap=True):
+        loop = asyncio.get_running_loop()
+        archive = await loop.run_in_executor(
+            executor, functools.partial(Archive.from_filename, filename, use_mmap)
+        )
+        return AsyncArchive(archive, executor, max_concurrency)
+
+    async def run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None:
+            return await loop.run_in_executor(self.executor, func, *args)
+        async with self._semaphore:
+            return await loop.run_in_executor(self.executor, func, *args)
+
+    async def close(self):
+        await self.run(self.archive.close)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    def __getitem__(self, key):
+        return self.get_object(key)
+
+    async def get_object(self, path):
+        # object headers are parsed in the executor, never on the event loop
+        return AsyncObject(self, await self.run(self.archive.__getitem__, path))
+
+    async def paths(self):
+        return await self.run(self.archive.paths)
+
+    async def find(self, pattern):
+        items = await self.run(self.archive.find, pattern)
+        return [AsyncObject(self, item) for item in items]
+
+    async def _coalesce(self, key, func, *args):
+        # concurrent requests for the same sample share a single read
+        future = self._pending.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self.run(func, *args))
+            self._pending[key] = future
+            future.add_done_callback(lambda _: self._pending.pop(key, None))
+        # a cancelled request must not cancel the other ones
+        return await asyncio.shield(future)
+
+    async def read(self, prop, _index, encoder=None):
+        true_index = prop.get_sample_index(_index)
+        if true_index is None:
+            return None
+        return await self._coalesce(
+            (prop, true_index, encoder, False), prop.get_sample, _index, encoder
+        )
+
+    async def decode(self, prop, _index, encoder=numpy_property):
+        true_index = prop.get_sample_index(_index)
+        if true_index is None:
+            return None
+        return await self._coalesce(
+            (prop, true_index, encoder, True), prop.get_decoded_sample, _index, encoder
+        )
+
+
+def _wrap_property(archive, prop):
+    if isinstance(prop, CompoundProperty):
+        return AsyncCompoundProperty(archive, prop)
+    return AsyncProperty(archive, prop)
+
+
+class AsyncObject:
+    def __init__(self, archive, obj):
+        self.archive = archive
+        self.object = obj
+        self.name = obj.name
+        self.metadata = obj.metadata
+
+    async def get_properties(self):
+        properties = await self.archive.run(getattr, self.object, "properties")
+        return AsyncCompoundProperty(self.archive, properties)
+
+    async def get_property(self, property_path):
+        return _wrap_property(
+            self.archive,
+            await self.archive.run(self.object.get_property, property_path),
+        )
+
+    async def get_children(self):
+        children = await self.archive.run(getattr, self.object, "children")
+        return [AsyncObject(self.archive, child) for child in children]
+
+    def __getitem__(self, key):
+        return self.get_child(key)
+
+    async def get_child(self, key):
+        return AsyncObject(
+            self.archive, await self.archive.run(self.object.__getitem__, key)
+        )
+
+    def get_schema(self):
+        return self.object.get_schema()
+
+    async def aiter_frames(
+        self, properties=None, start=0, stop=None, prefetch=2, encoder=numpy_property
+    ):
+        nodes = await self.archive.run(self.object.get_sample_properties, properties)
+        num_frames = max((prop.num_samples for prop in nodes.values()), default=0)
+        stop = num_frames if stop is None else min(stop, num_frames)
+
+        async def _decode_frame(frame):
+            indices = get_frame_indices(nodes, frame)
+            samples = await asyncio.gather(
+                *(
+                    self.archive.decode(prop, indices[property_path], encoder)
+                    for property_path, prop in nodes.items()
+                )
+            )
+            return dict(zip(nodes.keys(), samples))
+
+        async for frame_samples in _aiter_prefetched(
+            _decode_frame, range(start, stop), prefetch
+        ):
+            yield frame_samples
+
+
+class AsyncCompoundProperty:
+    def __init__(self, archive, compound):
+        self.archive = archive
+        self.compound = compound
+        self.name = compound.name
+        self.metadata = compound.metadata
+
+    async def get_children(self):
+        children = await self.archive.run(getattr, self.compound, "children")
+        return [_wrap_property(self.archive, child) for child in children]
+
+    def __getitem__(self, key):
+        return self.get_child(key)
+
+    async def get_child(self, key):
+        return _wrap_property(
+            self.archive, await self.archive.run(self.compound.__getitem__, key)
+        )
+
+
+class AsyncProperty:
+    def __init__(self, archive, prop):
+        self.archive = archive
+        self.property = prop
+
+    def __getattr__(self, name):
+        # header fields (num_samples, pod_type_format, ...) are read directly
+        return getattr(self.property, name)
+
+    async def aget_sample(self, _index, encoder=None):
+        return await self.archive.read(self.property, _index, encoder)
+
+    async def aget_decoded_sample(self, _index, encoder=numpy_property):
+        return await self.archive.decode(self.property, _index, encoder)
+
+    async def aget_sample_at_time(self, time, mode="floor", encoder=numpy_property):
+        _index = self.property.get_sample_index_at_time(time, mode)
+        if _index is None:
+            return None
+        return await self.aget_decoded_sample(_index, encoder)
+
+    async def aiter_samples(
+        self, start=0, stop=None, prefetch=2, encoder=numpy_property
+    ):
+        num_samples = self.property.num_samples
+        stop = num_samples if stop is None else min(stop, num_samples)
+
+        async def _decode(_index):
+            return await self.aget_decoded_sample(_index, encoder)
+
+        async for sample in _aiter_prefetched(_decode, range(start, stop), prefetch):
+            yield sample
@@ -1,17 +1,40 @@
-from .ogawa import Ogawa
-from .properties import CompoundProperty
-from .schema import registered_schemas
+import fnmatch
+from .cache import SampleCache
+from .metadata import parse_metadata
+from .ogawa import Ogawa, UINT32
+from .parallel import map_samples
+from .encoders import numpy_property
+from .properties import CompoundProperty, iter_prefetched
+from .sampling import TimeSampling
+from .schema import AbcGeom_GeomBase_v1, registered_schemas
 
 
 class ArchiveException(Exception):
     pass
 
 
+def get_sample_index(schema, sample_or_time):
+    # integers are sample indices, floats are times, times before the first
+    # sample get the first one
+    if isinstance(sample_or_time, float):
+        return schema.get_sample_index_at_time(sample_or_time) or 0
+    return sample_or_time
+
+
+def get_frame_indices(nodes, frame):
+    # properties with less samples (like constant ones) hold their last one
+    return {
+        property_path: min(frame, prop.num_samples - 1)
+        for property_path, prop in nodes.items()
+    }
+
+
 class Archive:
 
     def __init__(self, storage: Ogawa, encoding="utf8"):
         self.storage = storage
         self.encoding = encoding
+        self.sample_cache = SampleCache()
 
         if len(self.storage.root.children) < 6:
             raise ArchiveException("Expected at least 6 nodes in storage")
@@ -28,55 +51,63 @@ class Archive:
         if not self.storage.root.is_data(3):
             raise ArchiveException("Expected node 3 (metadata) to be data")
 
-        self.metadata = {}
-
-        for item in self.storage.root.get_data(3).split_and_encode(b";", encoder=bytes):
-            key, value = item.split(b"=")
-            self.metadata[key.decode(self.encoding)] = value.decode(self.encoding)
+        self.metadata = parse_metadata(
+            self.storage.root.get_data(3).view, self.encoding
+        )
 
         if not self.storage.root.is_data(4):
             raise ArchiveException("Expected node 4 (time_samples) to be data")
 
-        self.max_sample = self.storage.root.get_data(4).read_u32(0)
-        self.time_per_cycle = self.storage.root.get_data(4).read_f64(4)
-        self.samples = []
-        num_samples = self.storage.root.get_data(4).read_u32(12)
-        for i in range(0, num_samples):
-            self.samples.append(
-                self.storage.root.get_data(4).read_f64(12 + 4 + (i * 8))
-            )
+        self.time_samplings = TimeSampling.from_data(self.storage.root.get_data(4))
+        if not self.time_samplings:
+            self.time_samplings.append(TimeSampling())
+
+        # the first time sampling is exposed directly for convenience
+        self.max_sample = self.time_samplings[0].max_sample
+        self.time_per_cycle = self.time_samplings[0].time_per_cycle
+        self.samples = self.time_samplings[0].samples
 
         if not self.storage.root.is_data(5):
             raise ArchiveException("Expected node 3 (indexed_metadata) to be data")
 
         self.indexed_metadata = [b""]
 
+        indexed_metadata = self.storage.root.get_data(5).view
         offset = 0
-        while offset < self.storage.root.get_data(5).size:
-            metadata_size = self.storage.root.get_data(5).read_u8(offset)
+        while offset < len(indexed_metadata):
+            metadata_size = indexed_metadata[offset]
             offset += 1
-            metadata = self.storage.root.get_data(5).view[
-                offset : offset + metadata_size
-            ]
+            self.indexed_metadata.append(
+                indexed_metadata[offset : offset + metadata_size]
+            )
             offset += metadata_size
-            self.indexed_metadata.append(metadata)
+        self._parsed_metadata = [None] * len(self.indexed_metadata)
 
         self.root = Object(
             self, None, "ABC", self.metadata, self.storage.root.get_group(2)
         )
+        self._paths = None
+
+    def get_indexed_metadata(self, index):
+        # every index is decoded once and shared by all the nodes using it
+        metadata = self._parsed_metadata[index]
+        if metadata is None:
+            metadata = parse_metadata(self.indexed_metadata[index], self.encoding)
+            self._parsed_metadata[index] = metadata
+        return metadata
 
     @staticmethod
-    def from_filename(filename):
-        return Archive(Ogawa.from_filename(filename))
-
-    @staticmethod
-    def from_filename(filename):
-        return Archive(Ogawa.from_filename(filename))
+    def from_filename(filename, use_mmap=True):
+        return Archive(Ogawa.from_filename(filename, use_mmap=use_mmap))
 
     @staticmethod
     def from_file(handle):
         return Archive(Ogawa.from_file(handle))
 
+    @staticmethod
+    def from_storage(source):
+        return Archive(Ogawa.from_storage(source))
+
     @staticmethod
     def from_tree(tree):
         return Archive(Ogawa.from_tree(tree))
@@ -85,85 +116,283 @@ class Archive:
     def from_buffer(data):
         return Archive(Ogawa(data))
 
+    def close(self):
+        self.storage.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
     def __getitem__(self, key):
         if not key.startswith("/"):
             raise ArchiveException("Object path has to start with a /")
+        if self._paths is not None and key in self._paths:
+            return self._paths[key]
         parts = key.split("/")
         item = self.root
         for part in parts[1:]:
             item = item[part]
         return item
 
+    def paths(self):
+        if self._paths is None:
+            self._paths = {}
+
+            def _index_node(prefix, node):
+                for child in node.children:
+                    path = prefix + "/" + child.name
+                    self._paths.setdefault(path, child)
+                    _index_node(path, child)
+
+            _index_node("", self.root)
+        return list(self._paths.keys())
+
+    def find(self, pattern):
+        if not pattern.startswith("/"):
+            raise ArchiveException("Object path has to start with a /")
+        # every path segment is matched on its own, so wildcards never cross a /
+        items = [self.root]
+        for part in pattern.split("/")[1:]:
+            items = [
+                child
+                for item in items
+                for child in item.children
+                if fnmatch.fnmatchcase(child.name, part)
+            ]
+        return items
+
+    def world_matrices(self, sample_or_time=0):
+        import numpy
+
+        is_time = isinstance(sample_or_time, float)
+        key = ("world_matrices", is_time, sample_or_time)
+        world = self.sample_cache.get(key)
+        if world is not None:
+            return world
+
+        # paths are in depth first order, parents always come first
+        paths = self.paths()
+        index = {path: i for i, path in enumerate(paths)}
+        parents = numpy.array(
+            [index.get(path.rsplit("/", 1)[0], -1) for path in paths], dtype=numpy.int64
+        )
+        depths = numpy.array([path.count("/") for path in paths], dtype=numpy.int64)
+
+        local = numpy.tile(numpy.identity(4), (len(paths), 1, 1))
+        inherits = numpy.ones(len(paths), dtype=bool)
+        for i, path in enumerate(paths):
+            obj = self._paths[path]
+            if obj.metadata.get("schema") != "AbcGeom_Xform_v3":
+                continue
+            xform = obj.to_schema()
+            sample_index = get_sample_index(xform, sample_or_time)
+            # times between samples are interpolated
+            if is_time:
+                local[i] = xform.get_interpolated_matrix(sample_or_time)
+            else:
+                local[i] = xform.get_matrix(sample_index)
+            inherits[i] = xform.get_inherits(sample_index)
+
+        # every depth level is composed with its parents in a single batch
+        world = local.copy()
+        for depth in range(2, int(depths.max(initial=1)) + 1):
+            level = numpy.flatnonzero((depths == depth) & inherits)
+            world[level] = numpy.matmul(local[level], world[parents[level]])
+
+        world.flags.writeable = False
+        self.sample_cache.put(key, world, world.nbytes)
+        return world
+
+    def bounds_table(self, frames=None):
+        import numpy
+
+        frames = [0] if frames is None else list(frames)
+        paths = self.paths()
+        table = numpy.full((len(paths), len(frames), 6), numpy.nan)
+        for i, path in enumerate(paths):
+            obj = self._paths[path]
+            schema_class = registered_schemas.get(obj.metadata.get("schema"))
+            if schema_class is None or not issubclass(
+                schema_class, AbcGeom_GeomBase_v1
+            ):
+                continue
+            # only the bounds nodes of the object are paged in
+            schema = obj.to_schema()
+            for j, frame in enumerate(frames):
+                bounds = schema.get_self_bounds(get_sample_index(schema, frame))
+                if bounds is not None:
+                    table[i, j] = bounds
+        return table
+
+    def map_samples(self, func, paths, properties, workers=None):
+        # pool workers reopen the archive file, only in process decoding
+        # works with in memory archives
+        if self.storage.filename is None and workers != 1:
+            raise ArchiveException("Parallel decoding requires a file backed archive")
+        keys = []
+        nodes = []
+        for path in paths:
+            path_properties = self[path].get_sample_properties(properties)
+            for property_path, prop in path_properties.items():
+                keys.append((path, property_path))
+                nodes.append(prop)
+        # results are returned per (path, property) with a row per sample
+        results = map_samples(func, self.storage, nodes, workers)
+        mapped = {}
+        offset = 0
+        for key, prop in zip(keys, nodes):
+            mapped[key] = results[offset : offset + prop.num_samples]
+            offset += prop.num_samples
+        return mapped
+
 
 class Object:
+    __slots__ = (
+        "archive",
+        "parent",
+        "name",
+        "metadata",
+        "tree",
+        "_children",
+        "_properties",
+        "_index",
+    )
+
     def __init__(self, archive, parent, name, metadata, tree):
+        self.archive = archive
         self.parent = parent
         self.name = name
         self.metadata = metadata
-        self.children = []
-
-        self.properties = CompoundProperty("", archive, tree.children[0])
+        self.tree = tree
+        # children and properties are parsed on first access
+        self._children = None
+        self._properties = None
+        self._index = None
+
+    @property
+    def properties(self):
+        if self._properties is None:
+            self._properties = CompoundProperty("", self.archive, self.tree.children[0])
+        return self._properties
+
+    @property
+    def children(self):
+        if self._children is None:
+            self._children = self._parse_children()
+        return self._children
+
+    def _parse_children(self):
+        archive = self.archive
+        tree = self.tree
+        children = []
 
         if not tree:
-            return
+            return children
 
         # retrieve children
-        objects_headers_group = tree.get_data(-1)
-        objects_headers_group_size = objects_headers_group.size
+        objects_headers = tree.get_data(-1).view
 
-        objects_headers_size = objects_headers_group_size - 32
+        objects_headers_size = len(objects_headers) - 32
 
         offset = 0
         child_object_index = 0
         while offset < objects_headers_size:
-            child_name_size = objects_headers_group.read_u32(offset)
+            child_name_size = UINT32.unpack_from(objects_headers, offset)[0]
             offset += 4
-            child_name = bytes(
-                objects_headers_group.view[offset : offset + child_name_size]
-            ).decode(archive.encoding)
+            child_name = str(
+                objects_headers[offset : offset + child_name_size], archive.encoding
+            )
             offset += child_name_size
-            child_metadata_index_or_size = objects_headers_group.read_u8(offset)
+            child_metadata_index = objects_headers[offset]
             offset += 1
-            if child_metadata_index_or_size < len(archive.indexed_metadata):
-                child_metadata = self._build_metadata(
-                    archive.indexed_metadata[child_metadata_index_or_size],
+            if child_metadata_index == 0xFF:
+                child_metadata_size = UINT32.unpack_from(objects_headers, offset)[0]
+                offset += 4
+                child_metadata = parse_metadata(
+                    objects_headers[offset : offset + child_metadata_size],
                     archive.encoding,
                 )
+                offset += child_metadata_size
+            elif child_metadata_index < len(archive.indexed_metadata):
+                child_metadata = archive.get_indexed_metadata(child_metadata_index)
             else:
-                child_inline_metadata = objects_headers_group.view[
-                    offset : offset + child_metadata_index_or_size
-                ]
-                offset += child_metadata_index_or_size
-                child_metadata = self._build_metadata(
-                    child_inline_metadata, archive.encoding
+                raise ArchiveException(
+                    "Invalid metadata index: {}".format(child_metadata_index)
                 )
-            self.children.append(
+            children.append(
                 Object(
                     archive,
                     self,
                     child_name,
                     child_metadata,
-                    tree.children[child_object_index + 1],
+                    tree.get_group(child_object_index + 1),
                 )
             )
             child_object_index += 1
 
-    def _build_metadata(self, blob, encoding):
-        metadata = {}
-        for item in bytes(blob).split(b";"):
-            key, value = item.split(b"=")
-            metadata[key.decode(encoding)] = value.decode(encoding)
-        return metadata
+        return children
 
     def __getitem__(self, key):
         if isinstance(key, str):
-            matching = [i for i, o in enumerate(self.children) if o.name == key]
-            if matching:
-                key = matching[0]
-            else:
+            if self._index is None:
+                self._index = {}
+                for i, child in enumerate(self.children):
+                    self._index.setdefault(child.name, i)
+            if key not in self._index:
                 raise KeyError(key)
+            key = self._index[key]
         return self.children[key]
 
+    def _get_property_paths(self, compound, prefix=""):
+        paths = []
+        for child in compound.children:
+            if isinstance(child, CompoundProperty):
+                paths += self._get_property_paths(child, prefix + child.name + "/")
+            else:
+                paths.append(prefix + child.name)
+        return paths
+
+    def get_property(self, property_path):
+        prop = self.properties
+        for part in property_path.split("/"):
+            prop = prop[part]
+        return prop
+
+    def get_sample_properties(self, properties=None):
+        if properties is None:
+            properties = self._get_property_paths(self.properties)
+        nodes = {}
+        for property_path in properties:
+            prop = self.get_property(property_path)
+            if isinstance(prop, CompoundProperty):
+                raise ArchiveException(
+                    "{} is a compound property".format(property_path)
+                )
+            # set up the samples before any worker thread touches them
+            prop._setup()
+            nodes[property_path] = prop
+        return nodes
+
+    def iter_frames(
+        self, properties=None, start=0, stop=None, prefetch=2, encoder=numpy_property
+    ):
+        nodes = self.get_sample_properties(properties)
+        num_frames = max((prop.num_samples for prop in nodes.values()), default=0)
+        stop = num_frames if stop is None else min(stop, num_frames)
+
+        def _decode_frame(frame):
+            indices = get_frame_indices(nodes, frame)
+            for property_path, prop in nodes.items():
+                prop.prefetch_sample(indices[property_path])
+            return {
+                property_path: prop.get_decoded_sample(indices[property_path], encoder)
+                for property_path, prop in nodes.items()
+            }
+
+        return iter_prefetched(_decode_frame, range(start, stop), prefetch)
+
     def get_schema(self):
         return self.metadata["schema"]
 
@@ -171,10 +400,11 @@ class Object:
         return registered_schemas[self.get_schema()](
             self, default_property_encoder=default_property_encoder
         )
-    
+
     def traverse(self, func):
         def _process_node(parent, node):
             func(parent, node)
             for child in node.children:
                 _process_node(node, child)
+
         _process_node(self.parent, self)
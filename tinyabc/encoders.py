@@ -1,10 +1,59 @@
-def numpy_property(node, sample):
+struct_to_numpy_table = {
+    "?": "?",
+    "B": "u1",
+    "b": "i1",
+    "H": "<u2",
+    "h": "<i2",
+    "I": "<u4",
+    "i": "<i4",
+    "Q": "<u8",
+    "q": "<i8",
+    "e": "<f2",
+    "f": "<f4",
+    "d": "<f8",
+}
+
+
+def _split_strings(numpy, codes, dtype):
+    # every string is terminated by a zero code unit, the strings are
+    # scattered into a zero padded (count, width) table that numpy can
+    # view directly as a fixed width string array
+    ends = numpy.flatnonzero(codes == 0)
+    if ends.size == 0:
+        return numpy.empty(0, dtype=dtype + "1")
+    starts = numpy.empty_like(ends)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    lengths = ends - starts
+    width = max(int(lengths.max()), 1)
+    table = numpy.zeros((ends.size, width), dtype=codes.dtype)
+    rows = numpy.repeat(numpy.arange(ends.size), lengths)
+    columns = numpy.arange(rows.size) - (numpy.cumsum(lengths) - lengths)[rows]
+    table[rows, columns] = codes[starts[rows] + columns]
+    return table.view("{}{}".format(dtype, width)).reshape(ends.size)
+
+
+def numpy_property(node, sample, sample_index=None):
     import numpy
 
-    struct_to_numpy_table = {"i": numpy.int32, "I": numpy.uint32, "f": numpy.float32}
+    if node.pod_type_format == "string":
+        return numpy.char.decode(
+            _split_strings(numpy, numpy.frombuffer(sample, dtype="u1"), "S"),
+            "utf8",
+        )
+
+    if node.pod_type_format == "wstring":
+        return _split_strings(numpy, numpy.frombuffer(sample, dtype="<u4"), "<U")
+
     np_array = numpy.frombuffer(
         sample, dtype=struct_to_numpy_table[node.pod_type_format]
     )
+
+    shape = (-1,)
+    if sample_index is not None and hasattr(node, "dims"):
+        shape = tuple(node.dims[node.get_sample_index(sample_index)])
     if node.extent > 1:
-        return np_array.reshape((-1, node.extent))
+        shape += (node.extent,)
+    if len(shape) > 1:
+        return np_array.reshape(shape)
     return np_array
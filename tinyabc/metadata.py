@@ -0,0 +1,36 @@
+import sys
+from types import MappingProxyType
+
+EMPTY_METADATA = MappingProxyType({})
+
+
+class MetadataException(Exception):
+    pass
+
+
+def parse_metadata(blob, encoding="utf8"):
+    blob = bytes(blob)
+    if not blob:
+        return EMPTY_METADATA
+    # like Alembic, nothing is unescaped, backslashes are plain characters
+    metadata = {}
+    for item in blob.split(b";"):
+        if not item:
+            continue
+        # values may contain the key separator, only the first one counts
+        key, _, value = item.partition(b"=")
+        metadata[sys.intern(key.decode(encoding))] = value.decode(encoding)
+    return MappingProxyType(metadata)
+
+
+def serialize_metadata(metadata, encoding="utf8"):
+    # Alembic keeps metadata sorted by key and does not support separators
+    # in keys or values
+    for key, value in metadata.items():
+        if ";" in key or "=" in key or ";" in value or "=" in value:
+            raise MetadataException(
+                "Invalid metadata {}={}, ';' and '=' are not allowed".format(key, value)
+            )
+    return ";".join(
+        "{}={}".format(key, value) for key, value in sorted(metadata.items())
+    ).encode(encoding)
@@ -1,6 +1,17 @@
 from __future__ import annotations
 from typing import List, Union
+import array
+import hashlib
+import io
+import mmap
 import struct
+import sys
+
+UINT16 = struct.Struct("<H")
+UINT32 = struct.Struct("<I")
+UINT64 = struct.Struct("<Q")
+FLOAT32 = struct.Struct("<f")
+FLOAT64 = struct.Struct("<d")
 
 
 class OgawaException(Exception):
@@ -9,75 +20,159 @@ class OgawaException(Exception):
 
 class Ogawa:
     class Group:
+        __slots__ = ("storage", "offset", "nodes", "_num_children", "_headers")
+
         def __init__(self, storage: Ogawa, offset):
-            self.children: List[Union[Ogawa.Group, Ogawa.Data]] = []
+            self.storage = storage
+            self.offset = offset
+            # only groups built in memory (or empty ones) hold their nodes,
+            # stored groups decode child headers on demand
+            self.nodes: Union[List[Union[Ogawa.Group, Ogawa.Data]], None] = None
+            self._num_children = None
+            self._headers = None
 
             if offset == 0:
-                return
+                self.nodes = []
+                self._num_children = 0
+
+        @property
+        def num_children(self):
+            if self._num_children is None:
+                self._num_children = self.storage.read_u64(self.offset)
+            return self._num_children
+
+        @property
+        def children(self):
+            return self
+
+        def __len__(self):
+            if self.nodes is not None:
+                return len(self.nodes)
+            return self.num_children
+
+        def __getitem__(self, _index):
+            if isinstance(_index, slice):
+                return [self[i] for i in range(*_index.indices(len(self)))]
+            if self.nodes is not None:
+                return self.nodes[_index]
+            return self.storage._make_node(self._get_header(_index))
+
+        def __iter__(self):
+            for i in range(0, len(self)):
+                yield self[i]
+
+        def _get_headers(self):
+            # the child header table is read once into a compact array
+            # instead of a list of node objects
+            if self._headers is None:
+                headers = array.array("Q")
+                headers.frombytes(
+                    self.storage.read(self.offset + 8, 8 * self.num_children)
+                )
+                if sys.byteorder != "little":
+                    headers.byteswap()
+                self._headers = headers
+            return self._headers
+
+        def _get_header(self, _index):
+            try:
+                return self._get_headers()[_index]
+            except IndexError:
+                raise IndexError("group index out of range") from None
 
-            num_children = struct.unpack("<Q", storage.view[offset : offset + 8])[0]
-            for i in range(0, num_children):
-                node = storage._read_node_header(offset + 8 + (8 * i))
-                self.children.append(node)
+        def append(self, node):
+            if self.nodes is None:
+                raise OgawaException("Cannot append nodes to a stored group")
+            self.nodes.append(node)
 
         def is_group(self, _index):
-            return isinstance(self.children[_index], Ogawa.Group)
+            if self.nodes is not None:
+                return isinstance(self.nodes[_index], Ogawa.Group)
+            return self._get_header(_index) >> 63 == 0
 
         def is_data(self, _index):
-            return isinstance(self.children[_index], Ogawa.Data)
+            if self.nodes is not None:
+                return isinstance(self.nodes[_index], Ogawa.Data)
+            return self._get_header(_index) >> 63 == 1
 
         def get_data(self, _index) -> Ogawa.Data:
-            return self.children[_index]
+            return self[_index]
 
         def get_group(self, _index) -> Ogawa.Group:
-            return self.children[_index]
+            return self[_index]
 
     class Data:
-        def __init__(self, storage: Ogawa, offset):
-            self.size = 0
-
-            if offset == 0:
-                self.view = b""
-                return
+        __slots__ = ("storage", "offset", "_size", "_view")
 
-            self.size = struct.unpack("<Q", storage.view[offset : offset + 8])[0]
-            self.view = storage.view[offset + 8 : offset + 8 + self.size]
+        def __init__(self, storage: Ogawa, offset):
+            self.storage = storage
+            self.offset = offset
+            # size and payload are read on first access
+            self._size = 0 if offset == 0 else None
+            self._view = b"" if offset == 0 else None
+
+        @property
+        def size(self):
+            if self._size is None:
+                self._size = self.storage.read_u64(self.offset)
+            return self._size
+
+        @size.setter
+        def size(self, value):
+            self._size = value
+
+        @property
+        def view(self):
+            if self._view is None:
+                self._view = self.storage.read(self.offset + 8, self.size)
+            return self._view
+
+        @view.setter
+        def view(self, value):
+            self._view = value
+
+        def read(self, offset, size):
+            # reads part of the payload without loading all of it
+            if self._view is not None:
+                return self._view[offset : offset + size]
+            return self.storage.read(self.offset + 8 + offset, size)
 
         def read_u8(self, offset):
             return self.view[offset]
 
         def read_u16(self, offset):
-            return struct.unpack("<H", self.view[offset : offset + 2])[0]
+            return UINT16.unpack_from(self.view, offset)[0]
 
         def read_u32(self, offset):
-            return struct.unpack("<I", self.view[offset : offset + 4])[0]
+            return UINT32.unpack_from(self.view, offset)[0]
 
         def read_u64(self, offset):
-            return struct.unpack("<Q", self.view[offset : offset + 8])[0]
+            return UINT64.unpack_from(self.view, offset)[0]
 
         def read_f32(self, offset):
-            return struct.unpack("<f", self.view[offset : offset + 4])[0]
+            return FLOAT32.unpack_from(self.view, offset)[0]
 
         def read_f64(self, offset):
-            return struct.unpack("<d", self.view[offset : offset + 8])[0]
+            return FLOAT64.unpack_from(self.view, offset)[0]
 
         def split_and_encode(self, separator, encoder):
-            start = 0
-            for i in range(0, self.size):
-                if self.view[i : i + 1] == separator:
-                    yield encoder(self.view[start:i])
-                    start = i + 1
-            yield encoder(self.view[start:])
-
-    def __init__(self, data=None):
-        if data:
+            for chunk in bytes(self.view).split(separator):
+                yield encoder(chunk)
+
+    def __init__(self, data=None, source=None):
+        self._mapping = None
+        self.filename = None
+        # range readable storage, nodes are read from it instead of data
+        self.source = source
+        if data or source:
             self.data = data
-            self.view = memoryview(self.data)
-            self.magic = self.data[0:5]
+            self.view = memoryview(self.data) if data else None
+            header = self.read(0, 16)
+            self.magic = bytes(header[0:5])
             if self.magic != b"Ogawa":
                 raise OgawaException("Invalid magic value")
-            self.wflag = self.data[5]
-            self.version = tuple(self.data[6:8])
+            self.wflag = header[5]
+            self.version = tuple(header[6:8])
             self.root = self._read_node_header(8)
         else:
             self.data = b""
@@ -88,14 +183,74 @@ class Ogawa:
             self.root = Ogawa.Group(self, 0)
 
     @staticmethod
-    def from_filename(filename):
+    def from_filename(filename, use_mmap=True):
         with open(filename, "rb") as handle:
-            return Ogawa.from_file(handle)
+            ogawa = Ogawa.from_file(handle, use_mmap=use_mmap)
+        ogawa.filename = filename
+        return ogawa
+
+    @staticmethod
+    def from_storage(source):
+        return Ogawa(source=source)
 
     @staticmethod
-    def from_file(handle):
+    def from_file(handle, use_mmap=False):
+        if use_mmap:
+            try:
+                mapping = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # empty files cannot be mapped
+                return Ogawa(handle.read())
+            ogawa = Ogawa(mapping)
+            ogawa._mapping = mapping
+            return ogawa
         return Ogawa(handle.read())
 
+    def read(self, offset, size):
+        if self.source is not None:
+            return self.source.read(offset, size)
+        return self.view[offset : offset + size]
+
+    def read_u64(self, offset):
+        if self.source is not None:
+            return UINT64.unpack_from(self.source.read(offset, 8))[0]
+        return UINT64.unpack_from(self.view, offset)[0]
+
+    def close(self):
+        if self.source is not None:
+            self.source.close()
+            return
+        if self._mapping is None:
+            return
+        self.view.release()
+        try:
+            self._mapping.close()
+        except BufferError:
+            # views returned by Data nodes are still alive, the mapping
+            # will be released when the last of them is garbage collected
+            pass
+        self._mapping = None
+
+    def prefetch(self, offset, size):
+        # ask the kernel to read ahead the pages of a mapped range, so that
+        # decoding does not stall on page faults
+        if self.source is not None:
+            if hasattr(self.source, "prefetch"):
+                self.source.prefetch(offset, size)
+            return
+        if self._mapping is None or not hasattr(mmap, "MADV_WILLNEED"):
+            return
+        start = offset - offset % mmap.PAGESIZE
+        end = min(offset + size, len(self._mapping))
+        if end > start:
+            self._mapping.madvise(mmap.MADV_WILLNEED, start, end - start)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
     @staticmethod
     def from_tree(tree):
         ogawa = Ogawa()
@@ -108,10 +263,11 @@ class Ogawa:
                 memoryview(node)
                 new_data = Ogawa.Data(ogawa, 0)
                 new_data.view = node
-                parent.children.append(new_data)
+                new_data.size = memoryview(node).nbytes
+                parent.append(new_data)
             except:
                 new_group = Ogawa.Group(ogawa, 0)
-                parent.children.append(new_group)
+                parent.append(new_group)
                 for child in node:
                     _add_node(new_group, child)
 
@@ -121,7 +277,9 @@ class Ogawa:
         return ogawa
 
     def _read_node_header(self, offset):
-        value = struct.unpack("<Q", self.data[offset : offset + 8])[0]
+        return self._make_node(self.read_u64(offset))
+
+    def _make_node(self, value):
         if value >> 63 == 0:
             return Ogawa.Group(self, value)
         value &= 0x7FFFFFFFFFFFFFFF
@@ -164,51 +322,88 @@ class Ogawa:
         return chunks
 
     def serialize(self, optimize=False):
-        blob = bytearray()
-
-        blob += self.magic + struct.pack("<BBB", 0xFF, self.version[0], self.version[1])
-
-        blob += bytes(8)
-
-        chunks = self.collect_data()
-        offsets = {}
-
-        current_offset = len(blob)
-
+        handle = io.BytesIO()
+        self.to_file(handle, optimize=optimize)
+        return handle.getvalue()
+
+    def to_file(self, handle, optimize=False):
+        writer = OgawaWriter(handle, version=self.version, optimize=optimize)
+        root_headers = [writer.write_node(child) for child in self.root.children]
+        writer.close(root_headers)
+
+    def to_filename(self, filename, optimize=False):
+        with open(filename, "wb") as handle:
+            self.to_file(handle, optimize=optimize)
+
+
+class OgawaWriter:
+    def __init__(self, handle, version=(0, 1), optimize=False):
+        self.handle = handle
+        self.optimize = optimize
+        self.base = handle.tell()
+        self.offset = 0
+        # payload key -> data offset, only used when optimizing
+        self._written_data = {}
+        # the write flag stays 0 until the root group has been written
+        self._write(b"Ogawa" + struct.pack("<BBB", 0, version[0], version[1]))
+        self._write(bytes(8))
+
+    def _write(self, data):
+        self.handle.write(data)
+        self.offset += memoryview(data).nbytes
+
+    def write_data(self, data, key=None):
+        # a data node can be assembled from multiple chunks without
+        # joining them in memory
+        chunks = data if isinstance(data, (list, tuple)) else (data,)
+        size = sum(memoryview(chunk).nbytes for chunk in chunks)
+        if self.optimize:
+            # like Alembic, empty data is not stored at all
+            if size == 0:
+                return 0x8000000000000000
+            if key is None:
+                hasher = hashlib.blake2b(digest_size=16)
+                for chunk in chunks:
+                    hasher.update(chunk)
+                key = hasher.digest()
+            key = (size, key)
+            if key in self._written_data:
+                return self._written_data[key] | 0x8000000000000000
+            self._written_data[key] = self.offset
+        data_offset = self.offset
+        self._write(struct.pack("<Q", size))
         for chunk in chunks:
-            bytechunk = bytes(chunks[chunk])
-            blob += struct.pack("<Q", len(bytechunk)) + bytechunk
-            offsets[chunk] = current_offset
-            current_offset = len(blob)
-
-        def _serialize_node(blob, node, node_offset):
-            if isinstance(node, Ogawa.Data):
-                blob[node_offset : node_offset + 8] = struct.pack(
-                    "<Q", offsets[node] | 0x8000000000000000
-                )
-            else:
-                group_blob = struct.pack("<Q", len(node.children)) + bytes(
-                    8 * len(node.children)
-                )
-                group_offset = len(blob)
-                blob += group_blob
-                for i, child in enumerate(node.children):
-                    _serialize_node(blob, child, group_offset + 8 + (i * 8))
-                blob[node_offset : node_offset + 8] = struct.pack("<Q", group_offset)
-
-        root_group_offset = len(blob)
-
-        blob += struct.pack("<Q", len(self.root.children))
-
-        current_offset = len(blob)
-
-        blob += bytes(8 * len(self.root.children))
-
-        for child in self.root.children:
-            _serialize_node(blob, child, current_offset)
-            current_offset += 8
-
-        # update the root group offset
-        blob[8:16] = struct.pack("<Q", root_group_offset)
-
-        return blob
+            self._write(chunk)
+        return data_offset | 0x8000000000000000
+
+    def write_group(self, headers):
+        if self.optimize and not headers:
+            return 0
+        group_offset = self.offset
+        self._write(
+            struct.pack("<{}Q".format(len(headers) + 1), len(headers), *headers)
+        )
+        return group_offset
+
+    def write_node(self, node):
+        # children are written before their parent group, so every node
+        # is visited exactly once and its offset is known when the parent
+        # header table is built
+        if isinstance(node, Ogawa.Data):
+            return self.write_data(node.view)
+        return self.write_group([self.write_node(child) for child in node.children])
+
+    def close(self, root_headers):
+        root_group_offset = self.offset
+        self._write(
+            struct.pack(
+                "<{}Q".format(len(root_headers) + 1), len(root_headers), *root_headers
+            )
+        )
+        end = self.base + self.offset
+        self.handle.seek(self.base + 8)
+        self.handle.write(struct.pack("<Q", root_group_offset))
+        self.handle.seek(self.base + 5)
+        self.handle.write(b"\xff")
+        self.handle.seek(end)
+        self.handle.flush()
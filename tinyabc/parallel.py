@@ -0,0 +1,145 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from .ogawa import Ogawa
+from .properties import ArrayProperty, ScalarProperty
+
+# state of the current pool worker, set up once per process
+_worker = {}
+
+
+class ParallelException(Exception):
+    pass
+
+
+def describe_property(prop):
+    # everything needed to rebuild a property straight from its Ogawa group,
+    # without parsing the object hierarchy again
+    return (
+        isinstance(prop, ArrayProperty),
+        prop.name,
+        prop.pod_type_format,
+        prop.extent,
+        prop.next_sample_index,
+        prop.first_changed_index,
+        prop.last_changed_index,
+        prop.node.offset,
+    )
+
+
+def build_property(storage, description):
+    (
+        is_array,
+        name,
+        pod_type_format,
+        extent,
+        next_sample_index,
+        first_changed_index,
+        last_changed_index,
+        offset,
+    ) = description
+    return (ArrayProperty if is_array else ScalarProperty)(
+        name,
+        pod_type_format,
+        extent,
+        next_sample_index,
+        first_changed_index,
+        last_changed_index,
+        {},
+        Ogawa.Group(storage, offset),
+    )
+
+
+def run_items(func, get_property, items, results):
+    import numpy
+
+    for slot, property_index, sample_index in items:
+        result = numpy.asarray(
+            func(get_property(property_index).get_decoded_sample(sample_index))
+        )
+        # results are stored in a preallocated array, broadcasting would
+        # silently hide differently shaped values
+        if result.shape != results.shape[1:]:
+            raise ParallelException(
+                "Result shape {} does not match {}".format(
+                    result.shape, results.shape[1:]
+                )
+            )
+        results[slot] = result
+
+
+def _init_worker(filename, descriptions, shared_memory_name, shape, dtype):
+    from multiprocessing import shared_memory
+    import numpy
+
+    # every worker maps the file on its own, buffers are never pickled
+    _worker["storage"] = Ogawa.from_filename(filename)
+    _worker["descriptions"] = descriptions
+    _worker["properties"] = {}
+    _worker["shared_memory"] = shared_memory.SharedMemory(name=shared_memory_name)
+    _worker["results"] = numpy.ndarray(
+        shape, dtype=dtype, buffer=_worker["shared_memory"].buf
+    )
+
+
+def _get_worker_property(property_index):
+    properties = _worker["properties"]
+    if property_index not in properties:
+        properties[property_index] = build_property(
+            _worker["storage"], _worker["descriptions"][property_index]
+        )
+    return properties[property_index]
+
+
+def _run_chunk(func, items):
+    run_items(func, _get_worker_property, items, _worker["results"])
+
+
+def map_samples(func, storage, properties, workers=None):
+    from multiprocessing import shared_memory
+    import numpy
+
+    descriptions = [describe_property(prop) for prop in properties]
+    items = [
+        (slot, property_index, sample_index)
+        for slot, (property_index, sample_index) in enumerate(
+            (property_index, sample_index)
+            for property_index, prop in enumerate(properties)
+            for sample_index in range(prop.num_samples)
+        )
+    ]
+    if not items:
+        return numpy.empty(0)
+
+    # the first result defines the shape and type of the shared results
+    probe = numpy.asarray(func(properties[items[0][1]].get_decoded_sample(0)))
+    shape = (len(items),) + probe.shape
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1 or len(items) < 2:
+        # in process decoding uses the given properties, so archives without
+        # a backing file work too
+        results = numpy.empty(shape, dtype=probe.dtype)
+        run_items(func, properties.__getitem__, items, results)
+        return results
+
+    shared = shared_memory.SharedMemory(
+        create=True, size=max(int(numpy.prod(shape)) * probe.dtype.itemsize, 1)
+    )
+    try:
+        chunk_size = max(len(items) // (workers * 4), 1)
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(storage.filename, descriptions, shared.name, shape, probe.dtype),
+        ) as executor:
+            futures = [
+                executor.submit(_run_chunk, func, items[i : i + chunk_size])
+                for i in range(0, len(items), chunk_size)
+            ]
+            for future in futures:
+                future.result()
+        return numpy.ndarray(shape, dtype=probe.dtype, buffer=shared.buf).copy()
+    finally:
+        shared.close()
+        shared.unlink()
@@ -1,73 +1,132 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import struct
 import math
+from .encoders import numpy_property, struct_to_numpy_table
+from .metadata import parse_metadata
+from .ogawa import UINT32
+from .sampling import TimeSampling
+
+POD_TYPE_FORMATS = [
+    "?",
+    "B",
+    "b",
+    "H",
+    "h",
+    "I",
+    "i",
+    "Q",
+    "q",
+    "e",
+    "f",
+    "d",
+    "string",
+    "wstring",
+]
+
+SIZE_HINT_STRUCTS = (struct.Struct("<B"), struct.Struct("<H"), struct.Struct("<I"))
+SIZE_HINT_PAIR_STRUCTS = (
+    struct.Struct("<2B"),
+    struct.Struct("<2H"),
+    struct.Struct("<2I"),
+)
+
+
+# data headers have the high bit set, the rest is the offset in the file
+DATA_OFFSET_MASK = 0x7FFFFFFFFFFFFFFF
 
 
 class PropertyException(Exception):
     pass
 
 
+def iter_prefetched(func, indices, prefetch):
+    if prefetch < 1:
+        for _index in indices:
+            yield func(_index)
+        return
+    # at most prefetch items are processed ahead of the consumer
+    with ThreadPoolExecutor(max_workers=prefetch) as executor:
+        pending = deque()
+        try:
+            for _index in indices:
+                pending.append(executor.submit(func, _index))
+                if len(pending) > prefetch:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+
 class CompoundProperty:
-    def __init__(self, name, archive, tree):
+    __slots__ = ("name", "metadata", "archive", "tree", "_children", "_index")
+
+    def __init__(self, name, archive, tree, metadata=None):
         self.name = name
-        self.children = []
-        if not tree.children:
-            return
+        self.metadata = metadata if metadata is not None else {}
+        self.archive = archive
+        self.tree = tree
+        # headers are parsed on first access
+        self._children = None
+        self._index = None
+
+    @property
+    def children(self):
+        if self._children is None:
+            self._children = self._parse_headers()
+        return self._children
+
+    def _parse_headers(self):
+        children = []
+        if not self.tree.children:
+            return children
+        # the whole header block is decoded in one pass over a single view
+        header_node = self.tree.get_data(-1)
+        view = header_node.view
         offset = 0
-        properties_headers_size = tree.children[-1].size
+        properties_headers_size = header_node.size
         property_index = 0
         while offset < properties_headers_size:
             offset = self._parse_header(
-                self, archive, tree.children[-1], offset, tree.children[property_index]
+                children,
+                self.archive,
+                view,
+                offset,
+                self.tree.children[property_index],
             )
             property_index += 1
+        return children
 
-    def _parse_header(self, parent, archive, header_node, offset, property_node):
-        info = header_node.read_u32(offset)
+    def _parse_header(self, children, archive, view, offset, property_node):
+        info = UINT32.unpack_from(view, offset)[0]
         offset += 4
         property_type = info & 0x3
         size_hint = (info >> 2) & 0x3
-        size_hint_reader = [
-            (header_node.read_u8, 1),
-            (header_node.read_u16, 2),
-            (header_node.read_u32, 4),
-        ][size_hint]
+        size_hint_unpack_from = SIZE_HINT_STRUCTS[size_hint].unpack_from
+        size_hint_size = SIZE_HINT_STRUCTS[size_hint].size
 
-        metadata_index = -1
+        metadata_index = (info >> 20) & 0xFF
 
         # only scalar and array here
         if property_type != 0:
             pod_type = (info >> 4) & 0xF
-            pod_type_format = [
-                "?",
-                "B",
-                "b",
-                "H",
-                "h",
-                "I",
-                "i",
-                "Q",
-                "q",
-                "e",
-                "f",
-                "d",
-                "string",
-                "wstring",
-            ][pod_type]
+            pod_type_format = POD_TYPE_FORMATS[pod_type]
             has_time_sampling_index = (info >> 8) & 1
             has_first_and_last_changed_index = (info >> 9) & 1
             homogenous = (info >> 10) & 1
             zero_first_and_last_changed_index = (info >> 11) & 1
             extent = (info >> 12) & 0xFF
-            metadata_index = (info >> 20) & 0xFF
 
-            next_sample_index = size_hint_reader[0](offset)
-            offset += size_hint_reader[1]
+            next_sample_index = size_hint_unpack_from(view, offset)[0]
+            offset += size_hint_size
 
             if has_first_and_last_changed_index:
-                first_changed_index = size_hint_reader[0](offset)
-                offset += size_hint_reader[1]
-                last_changed_index = size_hint_reader[0](offset)
-                offset += size_hint_reader[1]
+                first_changed_index, last_changed_index = SIZE_HINT_PAIR_STRUCTS[
+                    size_hint
+                ].unpack_from(view, offset)
+                offset += size_hint_size * 2
             elif zero_first_and_last_changed_index:
                 first_changed_index = 0
                 last_changed_index = 0
@@ -75,29 +134,38 @@ class CompoundProperty:
                 first_changed_index = 1
                 last_changed_index = next_sample_index - 1
 
+            time_sampling_index = 0
             if has_time_sampling_index:
-                time_sampling_index = size_hint_reader[0](offset)
-                offset += size_hint_reader[1]
-                # TODO use it
-                time_sampling = 0
-            else:
-                time_sampling = 0
+                time_sampling_index = size_hint_unpack_from(view, offset)[0]
+                offset += size_hint_size
+            if time_sampling_index >= len(archive.time_samplings):
+                raise PropertyException(
+                    "Invalid time sampling index: {}".format(time_sampling_index)
+                )
+            time_sampling = archive.time_samplings[time_sampling_index]
 
-        name_size = size_hint_reader[0](offset)
-        offset += size_hint_reader[1]
+        name_size = size_hint_unpack_from(view, offset)[0]
+        offset += size_hint_size
 
-        name = bytes(header_node.view[offset : offset + name_size]).decode(
-            archive.encoding
-        )
+        name = str(view[offset : offset + name_size], archive.encoding)
         offset += name_size
 
         if metadata_index == 0xFF:
-            raise A
+            metadata_size = size_hint_unpack_from(view, offset)[0]
+            offset += size_hint_size
+            metadata = parse_metadata(
+                view[offset : offset + metadata_size], archive.encoding
+            )
+            offset += metadata_size
+        elif metadata_index < len(archive.indexed_metadata):
+            metadata = archive.get_indexed_metadata(metadata_index)
+        else:
+            raise PropertyException("Invalid metadata index: {}".format(metadata_index))
 
         if property_type == 0:
-            parent.children.append(CompoundProperty(name, archive, property_node))
+            children.append(CompoundProperty(name, archive, property_node, metadata))
         elif property_type == 1:
-            parent.children.append(
+            children.append(
                 ScalarProperty(
                     name,
                     pod_type_format,
@@ -105,12 +173,14 @@ class CompoundProperty:
                     next_sample_index,
                     first_changed_index,
                     last_changed_index,
-                    {},
+                    metadata,
                     property_node,
+                    time_sampling,
+                    archive,
                 )
             )
         else:  # we cover both 2 and 3 here, as 3 means "scalar like"
-            parent.children.append(
+            children.append(
                 ArrayProperty(
                     name,
                     pod_type_format,
@@ -118,8 +188,10 @@ class CompoundProperty:
                     next_sample_index,
                     first_changed_index,
                     last_changed_index,
-                    {},
+                    metadata,
                     property_node,
+                    time_sampling,
+                    archive,
                 )
             )
 
@@ -143,15 +215,32 @@ class CompoundProperty:
 
     def __getitem__(self, key):
         if isinstance(key, str):
-            matching = [i for i, o in enumerate(self.children) if o.name == key]
-            if matching:
-                key = matching[0]
-            else:
+            if self._index is None:
+                self._index = {}
+                for i, child in enumerate(self.children):
+                    self._index.setdefault(child.name, i)
+            if key not in self._index:
                 raise KeyError(key)
+            key = self._index[key]
         return self.children[key]
 
 
 class Property:
+    __slots__ = (
+        "name",
+        "pod_type_format",
+        "extent",
+        "next_sample_index",
+        "num_samples",
+        "first_changed_index",
+        "last_changed_index",
+        "metadata",
+        "node",
+        "time_sampling",
+        "archive",
+        "_samples",
+    )
+
     def __init__(
         self,
         name,
@@ -162,6 +251,8 @@ class Property:
         last_changed_index,
         meta,
         node,
+        time_sampling=None,
+        archive=None,
     ):
         self.name = name
         self.pod_type_format = pod_type_format
@@ -171,7 +262,22 @@ class Property:
         self.first_changed_index = first_changed_index
         self.last_changed_index = last_changed_index
         self.metadata = meta
-        self.setup_samples(node)
+        self.node = node
+        self.time_sampling = time_sampling if time_sampling else TimeSampling()
+        self.archive = archive
+        # sample nodes are set up on first access, their payloads are only
+        # read when a sample is requested
+        self._samples = None
+
+    def _setup(self):
+        if self._samples is None:
+            self.setup_samples(self.node)
+
+    def _get_sample_view(self, true_index):
+        return memoryview(self._samples[true_index].view)[16:]
+
+    def _get_key(self, true_index):
+        return bytes(self._samples[true_index].read(0, 16))
 
     def get_pod_size(self):
         if self.pod_type_format not in ("string", "wstring"):
@@ -182,9 +288,79 @@ class Property:
 
         true_index = self.get_sample_index(_index)
 
-        sample = self._samples[true_index]
+        self._setup()
+        sample = self._get_sample_view(true_index)
         return encoder(sample) if encoder else sample
 
+    def get_sample_key(self, _index):
+        true_index = self.get_sample_index(_index)
+        if true_index is None:
+            return None
+        self._setup()
+        return self._get_key(true_index)
+
+    def _get_cache_key(self, true_index):
+        # hand built trees and rebuilt properties have no digests (or no
+        # archive), their samples can not be shared
+        if self.archive is None:
+            return None
+        key = self._get_key(true_index)
+        if len(key) < 16 or key == bytes(16):
+            return None
+        return key
+
+    def get_sample_cache_key(self, _index):
+        true_index = self.get_sample_index(_index)
+        if true_index is None:
+            return None
+        self._setup()
+        return self._get_cache_key(true_index)
+
+    def get_decoded_sample(self, _index, encoder=numpy_property):
+        true_index = self.get_sample_index(_index)
+        if true_index is None:
+            return None
+        return self._decode_cached(true_index, encoder)
+
+    def _decode_cached(self, true_index, encoder):
+        self._setup()
+        sample = self._get_sample_view(true_index)
+        key = self._get_cache_key(true_index)
+        # identical samples share the same digest, so they are decoded once
+        # for the whole archive
+        if key is None:
+            return encoder(self, sample)
+        cache_key = (key, self.pod_type_format, self.extent, encoder)
+        value = self.archive.sample_cache.get(cache_key)
+        if value is None:
+            value = encoder(self, sample)
+            # cached arrays are handed to every object sharing the digest
+            if hasattr(value, "flags"):
+                value.flags.writeable = False
+            self.archive.sample_cache.put(
+                cache_key, value, getattr(value, "nbytes", len(sample))
+            )
+        return value
+
+    def prefetch_sample(self, _index):
+        true_index = self.get_sample_index(_index)
+        if true_index is None:
+            return
+        self._setup()
+        data = self._samples[true_index]
+        self.node.storage.prefetch(data.offset, data.size + 8)
+
+    def iter_samples(self, start=0, stop=None, prefetch=2, encoder=numpy_property):
+        stop = self.num_samples if stop is None else min(stop, self.num_samples)
+        # set up the samples before any worker thread touches them
+        self._setup()
+
+        def _decode(_index):
+            self.prefetch_sample(_index)
+            return self.get_decoded_sample(_index, encoder)
+
+        return iter_prefetched(_decode, range(start, stop), prefetch)
+
     def get_sample_index(self, _index):
         if _index >= self.next_sample_index or _index < 0:
             return None
@@ -199,33 +375,277 @@ class Property:
 
         return true_index
 
+    def get_sample_time(self, _index):
+        return self.time_sampling.get_sample_time(_index)
+
+    def get_sample_index_at_time(self, time, mode="floor"):
+        return self.time_sampling.get_sample_index(time, self.num_samples, mode)
+
+    def get_sample_at_time(self, time, mode="floor", encoder=None):
+        return self.get_sample(self.get_sample_index_at_time(time, mode), encoder)
+
+    def get_interpolated(self, time, out=None, slerp=False):
+        import numpy
+
+        floor_index = self.get_sample_index_at_time(time, "floor")
+        if floor_index is None:
+            return None
+        ceil_index = self.get_sample_index_at_time(time, "ceil")
+
+        self._setup()
+        floor_true_index = self.get_sample_index(floor_index)
+        ceil_true_index = self.get_sample_index(ceil_index)
+        floor_sample = self._decode_sample(floor_true_index)
+
+        if floor_true_index == ceil_true_index or not numpy.issubdtype(
+            floor_sample.dtype, numpy.floating
+        ):
+            ceil_sample = None
+        else:
+            ceil_sample = self._decode_sample(ceil_true_index)
+            # topology changed, there is nothing to blend
+            if ceil_sample.shape != floor_sample.shape:
+                ceil_sample = None
+
+        if ceil_sample is None:
+            # the decoded sample may be a read only view of the archive
+            if out is None:
+                return floor_sample.copy()
+            out[...] = floor_sample
+            return out
+
+        floor_time = self.get_sample_time(floor_index)
+        weight = (time - floor_time) / (self.get_sample_time(ceil_index) - floor_time)
+
+        if out is None:
+            out = numpy.empty_like(floor_sample)
+
+        if slerp:
+            return slerp_quaternions(numpy, floor_sample, ceil_sample, weight, out)
+
+        # blend in place to avoid allocating anything but the output
+        numpy.subtract(ceil_sample, floor_sample, out=out)
+        out *= weight
+        out += floor_sample
+        return out
+
+    def read_samples(self, start=0, stop=None, step=1):
+        import numpy
+
+        indices = numpy.arange(*slice(start, stop, step).indices(self.num_samples))
+        if self.first_changed_index == 0 and self.last_changed_index == 0:
+            true_indices = numpy.zeros_like(indices)
+        else:
+            true_indices = numpy.clip(
+                indices - self.first_changed_index + 1,
+                0,
+                self.last_changed_index - self.first_changed_index + 1,
+            )
+
+        if self.pod_type_format in ("string", "wstring"):
+            self._setup()
+            return self._read_string_samples(numpy, true_indices)
+
+        # samples are decoded straight into the output rows, bypassing the
+        # sample cache so that long reads do not evict it
+        dtype = numpy.dtype(struct_to_numpy_table[self.pod_type_format])
+        if not len(true_indices):
+            self._setup()
+            return numpy.empty(
+                (0,) + (self._get_sample_shape(0) if self._samples else ()),
+                dtype=dtype,
+            )
+
+        # true indices are monotonic, every stored sample covers a run of rows
+        run_starts = numpy.flatnonzero(numpy.diff(true_indices)) + 1
+        run_bounds = numpy.concatenate(([0], run_starts, [len(true_indices)]))
+        run_indices = true_indices[run_bounds[:-1]]
+
+        table = self._read_sample_table(numpy, run_indices, dtype)
+        if table is not None:
+            buffer, payloads, shapes = table
+
+            def _decode(run):
+                shape = shapes[run]
+                size = math.prod(shape) * dtype.itemsize
+                return (
+                    buffer[payloads[run] : payloads[run] + size]
+                    .view(dtype)
+                    .reshape(shape)
+                )
+
+        else:
+            self._setup()
+            shapes = [self._get_sample_shape(i) for i in run_indices.tolist()]
+
+            def _decode(run):
+                return numpy.frombuffer(
+                    self._get_sample_view(int(run_indices[run])), dtype=dtype
+                ).reshape(shapes[run])
+
+        # constant runs are broadcast without copying
+        if len(run_indices) == 1:
+            return numpy.broadcast_to(_decode(0), (len(true_indices),) + shapes[0])
+
+        if len(set(shapes)) == 1:
+            stacked = numpy.empty((len(true_indices),) + shapes[0], dtype=dtype)
+            for run in range(len(run_indices)):
+                first, last = run_bounds[run], run_bounds[run + 1]
+                stacked[first] = _decode(run)
+                stacked[first + 1 : last] = stacked[first]
+            return stacked
+
+        # topology changes between samples, return the concatenated
+        # elements and the offset of every sample in them
+        counts = numpy.repeat([shape[0] for shape in shapes], numpy.diff(run_bounds))
+        offsets = numpy.zeros(len(true_indices) + 1, dtype=numpy.int64)
+        numpy.cumsum(counts, out=offsets[1:])
+        values = numpy.empty((offsets[-1],) + shapes[0][1:], dtype=dtype)
+        for run in range(len(run_indices)):
+            sample = _decode(run)
+            for row in range(run_bounds[run], run_bounds[run + 1]):
+                values[offsets[row] : offsets[row + 1]] = sample
+        return values, offsets
+
+    def _read_sample_table(self, numpy, run_indices, dtype):
+        # payload offsets and shapes of the samples straight from the header
+        # table of the property group, without building a node per sample;
+        # only for in memory or mapped archives with rank 1 samples
+        node = self.node
+        storage = node.storage
+        if node.nodes is not None or storage.source is not None:
+            return None
+        headers = numpy.frombuffer(node._get_headers(), dtype=numpy.uint64)
+        children = run_indices * self.nodes_per_sample
+        if (
+            self.nodes_per_sample == 2
+            and (headers[children + 1] & DATA_OFFSET_MASK).any()
+        ):
+            return None
+        offsets = (headers[children] & DATA_OFFSET_MASK).astype(numpy.int64)
+        if not offsets.all():
+            return None
+        buffer = numpy.frombuffer(storage.view, dtype=numpy.uint8)
+        sizes = (
+            buffer[offsets[:, None] + numpy.arange(8)].view("<u8").ravel() - 16
+        ).tolist()
+        element_size = dtype.itemsize * self.extent
+        extent_shape = (self.extent,) if self.extent > 1 else ()
+        if any(size % element_size for size in sizes):
+            return None
+        if self.nodes_per_sample == 1:
+            if any(size != element_size for size in sizes):
+                return None
+            shapes = [extent_shape] * len(sizes)
+        else:
+            shapes = [(size // element_size,) + extent_shape for size in sizes]
+        # payloads follow the size and the 16 bytes digest
+        return buffer, (offsets + 24).tolist(), shapes
+
+    def _read_string_samples(self, numpy, true_indices):
+        unique_indices, inverse = numpy.unique(true_indices, return_inverse=True)
+        decoded = [self._decode_sample(true_index) for true_index in unique_indices]
+        if not decoded:
+            return numpy.empty(0, dtype=str)
+        if len(decoded) == 1:
+            return numpy.broadcast_to(
+                decoded[0], (len(true_indices),) + decoded[0].shape
+            )
+        if len({sample.shape for sample in decoded}) == 1:
+            return numpy.stack(decoded)[inverse]
+        counts = numpy.array([sample.shape[0] for sample in decoded])[inverse]
+        offsets = numpy.zeros(len(true_indices) + 1, dtype=numpy.int64)
+        numpy.cumsum(counts, out=offsets[1:])
+        return numpy.concatenate([decoded[i] for i in inverse]), offsets
+
+
+def slerp_quaternions(numpy, floor_sample, ceil_sample, weight, out):
+    # quaternions are packed in the last axis, the sign of the dot product
+    # picks the shortest path between each pair
+    dot = numpy.einsum("...i,...i->...", floor_sample, ceil_sample)
+    sign = numpy.where(dot < 0, -1.0, 1.0)
+    theta = numpy.arccos(numpy.clip(numpy.abs(dot), 0.0, 1.0))
+    sin_theta = numpy.sin(theta)
+    linear = sin_theta < 1e-6
+    sin_theta[linear] = 1.0
+    floor_weight = numpy.where(
+        linear, 1.0 - weight, numpy.sin((1.0 - weight) * theta) / sin_theta
+    )
+    ceil_weight = (
+        numpy.where(linear, weight, numpy.sin(weight * theta) / sin_theta) * sign
+    )
+    numpy.multiply(floor_sample, floor_weight[..., None], out=out)
+    for component in range(0, out.shape[-1]):
+        out[..., component] += ceil_sample[..., component] * ceil_weight
+    return out
+
 
 class ScalarProperty(Property):
+    __slots__ = ()
+
+    nodes_per_sample = 1
+
     def setup_samples(self, node):
-        self._samples = [child.view[16:] for child in node.children]
+        self._samples = node.children[:]
+
+    def _get_sample_shape(self, true_index):
+        return (self.extent,) if self.extent > 1 else ()
+
+    def _decode_sample(self, true_index):
+        return self._decode_cached(true_index, numpy_property).reshape(
+            self._get_sample_shape(true_index)
+        )
 
 
 class ArrayProperty(Property):
+    __slots__ = ("_dims_nodes", "_dims", "_num_elements")
+
+    nodes_per_sample = 2
+
+    @property
+    def dims(self):
+        self._setup()
+        if self._dims is None:
+            self._dims = [self._read_dims(i) for i in range(len(self._samples))]
+        return self._dims
+
+    @property
+    def num_elements(self):
+        self._setup()
+        if self._num_elements is None:
+            self._num_elements = [math.prod(dims) for dims in self.dims]
+        return self._num_elements
+
     def setup_samples(self, node):
-        self._samples = [child.view[16:] for child in node.children[::2]]
-        self.dims = [
-            (
-                struct.unpack("<{}Q".format(child.size // 8), child.view)
-                if child.size > 0
-                else (
-                    (
-                        ((node.children[_index * 2].size - 16) // self.get_pod_size())
-                        if self.pod_type_format not in ("string", "wstring")
-                        else node.children[_index * 2]
-                        .view[16:]
-                        .count(
-                            b"\x00"
-                            if self.pod_type_format == "string"
-                            else b"\x00\x00\x00\x00"  # wstring
-                        )
-                    ),
-                )
+        children = node.children[:]
+        self._samples = children[::2]
+        self._dims_nodes = children[1::2]
+        self._dims = None
+        self._num_elements = None
+
+    def _read_dims(self, true_index):
+        dims_node = self._dims_nodes[true_index]
+        if dims_node.size > 0:
+            return struct.unpack_from(
+                "<{}Q".format(dims_node.size // 8), dims_node.view
             )
-            for _index, child in enumerate(node.children[1::2])
-        ]
-        self.num_elements = [math.prod(dims) for dims in self.dims]
+        # rank 1 dims are not stored, they are derived from the sample
+        if self.pod_type_format not in ("string", "wstring"):
+            return ((self._samples[true_index].size - 16) // self.get_pod_size(),)
+        return (
+            bytes(self._get_sample_view(true_index)).count(
+                b"\x00" if self.pod_type_format == "string" else b"\x00\x00\x00\x00"
+            ),
+        )
+
+    def _get_sample_shape(self, true_index):
+        return tuple(
+            self._dims[true_index]
+            if self._dims is not None
+            else self._read_dims(true_index)
+        ) + ((self.extent,) if self.extent > 1 else ())
+
+    def _decode_sample(self, true_index):
+        return self._decode_cached(true_index, numpy_property).reshape(
+            self._get_sample_shape(true_index)
+        )
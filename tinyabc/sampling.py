@@ -0,0 +1,96 @@
+import bisect
+import math
+import struct
+import sys
+
+# Alembic marks acyclic samplings with this time per cycle
+ACYCLIC_TIME_PER_CYCLE = sys.float_info.max / 32.0
+
+TIME_EPSILON = 1e-9
+
+# max sample, time per cycle and number of sample times
+HEADER_STRUCT = struct.Struct("<IdI")
+
+
+class TimeSamplingException(Exception):
+    pass
+
+
+class TimeSampling:
+    def __init__(self, max_sample=0, time_per_cycle=1.0, samples=(0.0,)):
+        self.max_sample = max_sample
+        self.time_per_cycle = time_per_cycle
+        self.samples = list(samples)
+        if not self.samples:
+            raise TimeSamplingException("Expected at least one sample time")
+
+    def is_acyclic(self):
+        return self.time_per_cycle == ACYCLIC_TIME_PER_CYCLE
+
+    def is_uniform(self):
+        return not self.is_acyclic() and len(self.samples) == 1
+
+    def is_cyclic(self):
+        return not self.is_acyclic() and len(self.samples) > 1
+
+    def get_sample_time(self, _index):
+        if self.is_acyclic():
+            return self.samples[_index]
+        cycle, sample = divmod(_index, len(self.samples))
+        return self.samples[sample] + cycle * self.time_per_cycle
+
+    def get_floor_index(self, time, num_samples):
+        if num_samples < 1:
+            return None
+        if self.is_acyclic():
+            _index = (
+                bisect.bisect_right(
+                    self.samples,
+                    time + TIME_EPSILON,
+                    0,
+                    min(num_samples, len(self.samples)),
+                )
+                - 1
+            )
+        else:
+            # uniform and cyclic samplings map a time to its cycle in O(1),
+            # only the (usually tiny) cycle itself is searched
+            cycle = math.floor(
+                (time - self.samples[0] + TIME_EPSILON) / self.time_per_cycle
+            )
+            local_time = time - cycle * self.time_per_cycle
+            sample = bisect.bisect_right(self.samples, local_time + TIME_EPSILON) - 1
+            _index = cycle * len(self.samples) + max(sample, 0)
+        return min(max(_index, 0), num_samples - 1)
+
+    def get_sample_index(self, time, num_samples, mode="floor"):
+        floor_index = self.get_floor_index(time, num_samples)
+        if floor_index is None or mode == "floor":
+            return floor_index
+        if mode not in ("ceil", "nearest"):
+            raise TimeSamplingException("Unsupported sampling mode: {}".format(mode))
+
+        floor_time = self.get_sample_time(floor_index)
+        if time <= floor_time + TIME_EPSILON or floor_index == num_samples - 1:
+            return floor_index
+        if mode == "ceil":
+            return floor_index + 1
+        ceil_time = self.get_sample_time(floor_index + 1)
+        if ceil_time - time < time - floor_time:
+            return floor_index + 1
+        return floor_index
+
+    @staticmethod
+    def from_data(data):
+        time_samplings = []
+        view = data.view
+        offset = 0
+        while offset < data.size:
+            max_sample, time_per_cycle, num_samples = HEADER_STRUCT.unpack_from(
+                view, offset
+            )
+            offset += HEADER_STRUCT.size
+            samples = struct.unpack_from("<{}d".format(num_samples), view, offset)
+            offset += num_samples * 8
+            time_samplings.append(TimeSampling(max_sample, time_per_cycle, samples))
+        return time_samplings
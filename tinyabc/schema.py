@@ -1,6 +1,14 @@
+import struct
+from .encoders import numpy_property
+from .properties import CompoundProperty, slerp_quaternions
+
 registered_schemas = {}
 
 
+class SchemaException(Exception):
+    pass
+
+
 def register_schema(name):
     def wrapper(cls):
         registered_schemas[name] = cls
@@ -18,28 +26,607 @@ class Schema:
         current = self._object.properties
         for item in path:
             current = current[item]
-        sample = current.get_sample(sample_index)
         if not encoder:
             encoder = self.default_property_encoder
-        return encoder(current, sample) if encoder else sample
+        if encoder:
+            return current.get_decoded_sample(sample_index, encoder)
+        return current.get_sample(sample_index)
+
+    def read_field_samples(self, path, start=0, stop=None, step=1):
+        current = self._object.properties
+        for item in path:
+            current = current[item]
+        return current.read_samples(start, stop, step)
+
+    def _get_property(self, path):
+        current = self._object.properties
+        try:
+            for item in path:
+                current = current[item]
+        except KeyError:
+            return None
+        if isinstance(current, CompoundProperty) or current.num_samples > 0:
+            return current
+        return None
+
+    @staticmethod
+    def _get_clamped_index(prop, sample_index):
+        # constant properties hold their only sample
+        return min(sample_index, prop.num_samples - 1)
+
+
+def _get_cached(archive, key, func):
+    # samples without a usable digest have a None cache key and are never
+    # shared, results are read only either way
+    value = None
+    if archive is not None and None not in key:
+        value = archive.sample_cache.get(key)
+    if value is None:
+        value = func()
+        arrays = value if isinstance(value, tuple) else (value,)
+        for array in arrays:
+            array.flags.writeable = False
+        if archive is not None and None not in key:
+            archive.sample_cache.put(key, value, sum(array.nbytes for array in arrays))
+    return value
+
+
+# geoScope metadata of geometry parameters
+GEOM_SCOPE_CONSTANT = "con"
+GEOM_SCOPE_UNIFORM = "uni"
+GEOM_SCOPE_VARYING = "var"
+GEOM_SCOPE_VERTEX = "vtx"
+GEOM_SCOPE_FACE_VARYING = "fvr"
+
+
+class GeomParam:
+    __slots__ = ("name", "prop", "vals", "indices")
+
+    def __init__(self, prop):
+        self.name = prop.name
+        self.prop = prop
+        self.indices = None
+        if isinstance(prop, CompoundProperty):
+            # indexed parameters store unique values and a per element index
+            self.vals = prop[".vals"]
+            try:
+                self.indices = prop[".indices"]
+            except KeyError:
+                pass
+        else:
+            self.vals = prop
+
+    @property
+    def is_indexed(self):
+        return self.indices is not None
+
+    @property
+    def scope(self):
+        return self.prop.metadata.get("geoScope", self.vals.metadata.get("geoScope"))
+
+    @property
+    def num_samples(self):
+        if self.indices is None:
+            return self.vals.num_samples
+        return max(self.vals.num_samples, self.indices.num_samples)
+
+    def get_vals(self, sample_index=0, encoder=numpy_property):
+        return self.vals.get_decoded_sample(
+            Schema._get_clamped_index(self.vals, sample_index), encoder
+        )
+
+    def get_indices(self, sample_index=0, encoder=numpy_property):
+        if self.indices is None:
+            return None
+        return self.indices.get_decoded_sample(
+            Schema._get_clamped_index(self.indices, sample_index), encoder
+        )
+
+    def get_expanded(self, sample_index=0):
+        import numpy
+
+        if self.indices is None:
+            return self.get_vals(sample_index)
+        vals_index = Schema._get_clamped_index(self.vals, sample_index)
+        indices_index = Schema._get_clamped_index(self.indices, sample_index)
+        # the expansion is reused for as long as both samples are unchanged
+        key = (
+            "geom_param",
+            self.vals.get_sample_cache_key(vals_index),
+            self.indices.get_sample_cache_key(indices_index),
+            self.vals.pod_type_format,
+            self.vals.extent,
+        )
+        return _get_cached(
+            self.vals.archive,
+            key,
+            lambda: numpy.take(
+                self.get_vals(vals_index), self.get_indices(indices_index), axis=0
+            ),
+        )
 
 
 @register_schema("AbcGeom_GeomBase_v1")
 class AbcGeom_GeomBase_v1(Schema):
-    pass
+
+    def get_sample_index_at_time(self, time, mode="floor"):
+        prop = self._get_property((".geom", ".selfBnds")) or self._get_property(
+            (".geom", "P")
+        )
+        if prop is None:
+            return 0
+        return prop.get_sample_index_at_time(time, mode)
+
+    def get_array_field(self, path, sample_index, encoder=None):
+        # geometry arrays are numpy arrays unless another encoder is given
+        return self.get_field(
+            path,
+            sample_index,
+            encoder or self.default_property_encoder or numpy_property,
+        )
+
+    def get_self_bounds(self, sample_index=0):
+        import numpy
+
+        prop = self._get_property((".geom", ".selfBnds"))
+        if prop is not None:
+            return numpy.array(
+                prop.get_decoded_sample(self._get_clamped_index(prop, sample_index)),
+                dtype=numpy.float64,
+            ).reshape(6)
+
+        # without stored bounds the positions have to be decoded
+        prop = self._get_property((".geom", "P"))
+        if prop is None:
+            return None
+        positions = prop.get_decoded_sample(
+            self._get_clamped_index(prop, sample_index)
+        ).reshape(-1, 3)
+        if not len(positions):
+            return None
+        return numpy.concatenate((positions.min(axis=0), positions.max(axis=0))).astype(
+            numpy.float64
+        )
+
+    def get_geom_param(self, name):
+        # built in parameters live in .geom, user ones in .geom/.arbGeomParams
+        prop = self._get_property((".geom", name)) or self._get_property(
+            (".geom", ".arbGeomParams", name)
+        )
+        if prop is None:
+            raise SchemaException("Unknown geometry parameter {}".format(name))
+        return GeomParam(prop)
+
+    def get_arb_geom_params(self):
+        compound = self._get_property((".geom", ".arbGeomParams"))
+        if compound is None:
+            return {}
+        return {child.name: GeomParam(child) for child in compound.children}
+
+    def get_velocities(self, sample_index=0, encoder=None):
+        return self.get_array_field((".geom", ".velocities"), sample_index, encoder)
+
+    def get_child_bounds(self, sample_index=0):
+        import numpy
+
+        prop = self._get_property((".geom", ".childBnds"))
+        if prop is None:
+            return None
+        return numpy.array(
+            prop.get_decoded_sample(self._get_clamped_index(prop, sample_index)),
+            dtype=numpy.float64,
+        ).reshape(6)
+
+
+def _fan_triangulate(numpy, counts):
+    # every face with n corners becomes n - 2 triangles sharing its first
+    # corner, degenerate faces are dropped
+    counts = numpy.asarray(counts, dtype=numpy.int64)
+    starts = numpy.cumsum(counts) - counts
+    num_triangles = numpy.maximum(counts - 2, 0)
+    faces = numpy.repeat(numpy.arange(len(counts)), num_triangles)
+    first_triangles = numpy.cumsum(num_triangles) - num_triangles
+    steps = numpy.arange(len(faces)) - first_triangles[faces]
+    first_corners = starts[faces]
+    corners = numpy.stack(
+        (first_corners, first_corners + steps + 1, first_corners + steps + 2),
+        axis=1,
+    )
+    return corners, faces
 
 
 @register_schema("AbcGeom_PolyMesh_v1")
 class AbcGeom_PolyMesh_v1(AbcGeom_GeomBase_v1):
 
     def get_P(self, sample_index=0, encoder=None):
-        return self.get_field((".geom", "P"), sample_index, encoder)
+        return self.get_array_field((".geom", "P"), sample_index, encoder)
 
     def get_N(self, sample_index=0, encoder=None):
-        return self.get_field((".geom", "N"), sample_index, encoder)
+        return self.get_array_field((".geom", "N"), sample_index, encoder)
 
     def get_face_indices(self, sample_index=0, encoder=None):
-        return self.get_field((".geom", ".faceIndices"), sample_index, encoder)
+        return self.get_array_field((".geom", ".faceIndices"), sample_index, encoder)
 
     def get_face_counts(self, sample_index=0, encoder=None):
-        return self.get_field((".geom", ".faceCounts"), sample_index, encoder)
+        return self.get_array_field((".geom", ".faceCounts"), sample_index, encoder)
+
+    def _get_triangle_corners(self, sample_index):
+        import numpy
+
+        counts = self._object.properties[".geom"][".faceCounts"]
+        sample_index = self._get_clamped_index(counts, sample_index)
+        # animated meshes usually keep the same topology, so the triangulation
+        # is cached on the sample digest and computed once
+        key = ("triangle_corners", counts.get_sample_cache_key(sample_index))
+        return _get_cached(
+            self._object.archive,
+            key,
+            lambda: _fan_triangulate(numpy, counts.get_decoded_sample(sample_index)),
+        )
+
+    def triangulate(self, sample_index=0):
+        indices = self._object.properties[".geom"][".faceIndices"]
+        counts = self._object.properties[".geom"][".faceCounts"]
+        key = (
+            "triangulate",
+            counts.get_sample_cache_key(self._get_clamped_index(counts, sample_index)),
+            indices.get_sample_cache_key(
+                self._get_clamped_index(indices, sample_index)
+            ),
+        )
+
+        def _triangulate():
+            corners, _ = self._get_triangle_corners(sample_index)
+            return indices.get_decoded_sample(
+                self._get_clamped_index(indices, sample_index)
+            )[corners]
+
+        return _get_cached(self._object.archive, key, _triangulate)
+
+    def get_vertex_buffer(self, sample_index=0, attributes=("N", "uv")):
+        import numpy
+
+        triangles = self.triangulate(sample_index).reshape(-1)
+        corners, faces = self._get_triangle_corners(sample_index)
+        corners = corners.reshape(-1)
+        prop = self._object.properties[".geom"]["P"]
+        positions = prop.get_decoded_sample(
+            self._get_clamped_index(prop, sample_index)
+        ).reshape(-1, 3)
+        # every triangle corner gets its own vertex, so face varying
+        # parameters do not need to be split
+        columns = [positions[triangles]]
+        for name in attributes:
+            param = self.get_geom_param(name)
+            values = param.get_expanded(sample_index)
+            scope = param.scope
+            values = values.reshape(len(values), -1)
+            if scope is None:
+                scope = (
+                    GEOM_SCOPE_VERTEX
+                    if len(values) == len(positions)
+                    else GEOM_SCOPE_FACE_VARYING
+                )
+            if scope == GEOM_SCOPE_FACE_VARYING:
+                columns.append(values[corners])
+            elif scope in (GEOM_SCOPE_VERTEX, GEOM_SCOPE_VARYING):
+                columns.append(values[triangles])
+            elif scope == GEOM_SCOPE_UNIFORM:
+                columns.append(numpy.repeat(values[faces], 3, axis=0))
+            elif scope == GEOM_SCOPE_CONSTANT:
+                columns.append(
+                    numpy.broadcast_to(values[0], (len(corners), values.shape[1]))
+                )
+            else:
+                raise SchemaException("Unsupported scope {} for {}".format(scope, name))
+        return numpy.concatenate(columns, axis=1, dtype=numpy.float32)
+
+
+@register_schema("AbcGeom_SubD_v1")
+class AbcGeom_SubD_v1(AbcGeom_PolyMesh_v1):
+    # subdivision surfaces share the polygon topology of meshes, their cage
+    # is triangulated the same way
+
+    def get_crease_indices(self, sample_index=0, encoder=None):
+        return self.get_array_field((".geom", ".creaseIndices"), sample_index, encoder)
+
+    def get_crease_lengths(self, sample_index=0, encoder=None):
+        return self.get_array_field((".geom", ".creaseLengths"), sample_index, encoder)
+
+    def get_crease_sharpnesses(self, sample_index=0, encoder=None):
+        return self.get_array_field(
+            (".geom", ".creaseSharpnesses"), sample_index, encoder
+        )
+
+    def get_corner_indices(self, sample_index=0, encoder=None):
+        return self.get_array_field((".geom", ".cornerIndices"), sample_index, encoder)
+
+    def get_corner_sharpnesses(self, sample_index=0, encoder=None):
+        return self.get_array_field(
+            (".geom", ".cornerSharpnesses"), sample_index, encoder
+        )
+
+    def get_holes(self, sample_index=0, encoder=None):
+        return self.get_array_field((".geom", ".holes"), sample_index, encoder)
+
+    def get_scheme(self, sample_index=0):
+        prop = self._get_property((".geom", ".scheme"))
+        if prop is None:
+            return "catmull-clark"
+        return (
+            bytes(prop.get_sample(self._get_clamped_index(prop, sample_index)))
+            .decode("utf8")
+            .rstrip("\0")
+        )
+
+
+@register_schema("AbcGeom_Points_v1")
+class AbcGeom_Points_v1(AbcGeom_GeomBase_v1):
+
+    def get_P(self, sample_index=0, encoder=None):
+        return self.get_array_field((".geom", "P"), sample_index, encoder)
+
+    def get_ids(self, sample_index=0, encoder=None):
+        return self.get_array_field((".geom", ".pointIds"), sample_index, encoder)
+
+    def get_widths(self, sample_index=0):
+        return self.get_geom_param(".widths").get_expanded(sample_index)
+
+
+# curve type, periodicity and basis stored in .geom/curveBasisAndType
+CURVE_CUBIC = 0
+CURVE_LINEAR = 1
+CURVE_VARIABLE_ORDER = 2
+CURVE_NON_PERIODIC = 0
+CURVE_PERIODIC = 1
+CURVE_NO_BASIS = 0
+CURVE_BEZIER_BASIS = 1
+CURVE_BSPLINE_BASIS = 2
+CURVE_CATMULLROM_BASIS = 3
+CURVE_HERMITE_BASIS = 4
+CURVE_POWER_BASIS = 5
+
+
+@register_schema("AbcGeom_Curve_v2")
+class AbcGeom_Curve_v2(AbcGeom_GeomBase_v1):
+
+    def get_P(self, sample_index=0, encoder=None):
+        return self.get_array_field((".geom", "P"), sample_index, encoder)
+
+    def get_curve_vertex_counts(self, sample_index=0, encoder=None):
+        return self.get_array_field((".geom", "nVertices"), sample_index, encoder)
+
+    def get_orders(self, sample_index=0, encoder=None):
+        return self.get_array_field((".geom", ".orders"), sample_index, encoder)
+
+    def get_knots(self, sample_index=0, encoder=None):
+        return self.get_array_field((".geom", ".knots"), sample_index, encoder)
+
+    def get_widths(self, sample_index=0):
+        return self.get_geom_param(".widths").get_expanded(sample_index)
+
+    def get_basis_and_type(self, sample_index=0):
+        prop = self._object.properties[".geom"]["curveBasisAndType"]
+        curve_type, periodicity, basis = bytes(
+            prop.get_sample(self._get_clamped_index(prop, sample_index))
+        )[:3]
+        return curve_type, periodicity, basis
+
+
+# .geom/.core of cameras stores these 16 doubles
+CAMERA_CORE = struct.Struct("<16d")
+CAMERA_CORE_FIELDS = (
+    "focal_length",
+    "horizontal_aperture",
+    "horizontal_film_offset",
+    "vertical_aperture",
+    "vertical_film_offset",
+    "lens_squeeze_ratio",
+    "overscan_left",
+    "overscan_right",
+    "overscan_top",
+    "overscan_bottom",
+    "f_stop",
+    "focus_distance",
+    "shutter_open",
+    "shutter_close",
+    "near_clipping_plane",
+    "far_clipping_plane",
+)
+
+
+@register_schema("AbcGeom_Camera_v1")
+class AbcGeom_Camera_v1(Schema):
+
+    def get_sample_index_at_time(self, time, mode="floor"):
+        return self._object.properties[".geom"][".core"].get_sample_index_at_time(
+            time, mode
+        )
+
+    def get_core(self, sample_index=0, encoder=None):
+        prop = self._object.properties[".geom"][".core"]
+        return self.get_field(
+            (".geom", ".core"), self._get_clamped_index(prop, sample_index), encoder
+        )
+
+    def get_parameters(self, sample_index=0):
+        prop = self._object.properties[".geom"][".core"]
+        values = CAMERA_CORE.unpack_from(
+            prop.get_sample(self._get_clamped_index(prop, sample_index))
+        )
+        return dict(zip(CAMERA_CORE_FIELDS, values))
+
+    def get_focal_length(self, sample_index=0):
+        return self.get_parameters(sample_index)["focal_length"]
+
+    def get_film_back(self, sample_index=0):
+        parameters = self.get_parameters(sample_index)
+        return parameters["horizontal_aperture"], parameters["vertical_aperture"]
+
+    def get_clipping_planes(self, sample_index=0):
+        parameters = self.get_parameters(sample_index)
+        return parameters["near_clipping_plane"], parameters["far_clipping_plane"]
+
+
+# number of channels of every xform operation type, the type is stored in
+# the high nibble of each .ops byte
+XFORM_OPERATION_CHANNELS = (3, 3, 4, 16, 1, 1, 1)
+XFORM_SCALE = 0
+XFORM_TRANSLATE = 1
+XFORM_ROTATE = 2
+XFORM_MATRIX = 3
+XFORM_ROTATE_X = 4
+XFORM_ROTATE_Y = 5
+XFORM_ROTATE_Z = 6
+
+
+def _axis_angle_matrix(numpy, axis, degrees):
+    # row vector convention, like Imath
+    x, y, z = numpy.asarray(axis, dtype=numpy.float64) / numpy.linalg.norm(axis)
+    angle = numpy.radians(degrees)
+    sine = numpy.sin(angle)
+    cosine = numpy.cos(angle)
+    t = 1.0 - cosine
+    m = numpy.identity(4)
+    m[0, :3] = (x * x * t + cosine, x * y * t + z * sine, x * z * t - y * sine)
+    m[1, :3] = (x * y * t - z * sine, y * y * t + cosine, y * z * t + x * sine)
+    m[2, :3] = (x * z * t + y * sine, y * z * t - x * sine, z * z * t + cosine)
+    return m
+
+
+def _axis_angle_quaternion(numpy, channels):
+    # (x, y, z, w) packed in a (1, 4) array, as slerp_quaternions expects
+    axis = numpy.asarray(channels[:3], dtype=numpy.float64)
+    norm = numpy.linalg.norm(axis)
+    half_angle = numpy.radians(channels[3]) / 2.0
+    quaternion = numpy.zeros((1, 4))
+    if norm > 0:
+        quaternion[0, :3] = axis / norm * numpy.sin(half_angle)
+    quaternion[0, 3] = numpy.cos(half_angle)
+    return quaternion
+
+
+def _quaternion_axis_angle(numpy, quaternion):
+    quaternion = quaternion / numpy.linalg.norm(quaternion)
+    sine = numpy.linalg.norm(quaternion[:3])
+    if sine < 1e-12:
+        return numpy.array([0.0, 0.0, 1.0, 0.0])
+    degrees = numpy.degrees(2.0 * numpy.arctan2(sine, quaternion[3]))
+    return numpy.append(quaternion[:3] / sine, degrees)
+
+
+def _compose_matrix(numpy, ops, vals):
+    matrix = numpy.identity(4)
+    offset = 0
+    for op in ops:
+        operation_type = op >> 4
+        channels = vals[offset : offset + XFORM_OPERATION_CHANNELS[operation_type]]
+        offset += XFORM_OPERATION_CHANNELS[operation_type]
+        if operation_type == XFORM_SCALE:
+            m = numpy.diag(numpy.append(channels, 1.0))
+        elif operation_type == XFORM_TRANSLATE:
+            m = numpy.identity(4)
+            m[3, :3] = channels
+        elif operation_type == XFORM_ROTATE:
+            m = _axis_angle_matrix(numpy, channels[:3], channels[3])
+        elif operation_type == XFORM_MATRIX:
+            m = channels.reshape(4, 4)
+        else:
+            axis = numpy.zeros(3)
+            axis[operation_type - XFORM_ROTATE_X] = 1.0
+            m = _axis_angle_matrix(numpy, axis, channels[0])
+        # later operations are applied first, like Alembic does
+        matrix = m @ matrix
+    return matrix
+
+
+@register_schema("AbcGeom_Xform_v3")
+class AbcGeom_Xform_v3(Schema):
+
+    def _get_xform_property(self, name):
+        return self._get_property((".xform", name))
+
+    def get_num_samples(self):
+        props = [self._get_xform_property(name) for name in (".ops", ".vals")]
+        return max([prop.num_samples for prop in props if prop], default=1)
+
+    def get_sample_index_at_time(self, time, mode="floor"):
+        prop = self._get_xform_property(".vals") or self._get_xform_property(".ops")
+        if prop is None:
+            return 0
+        return prop.get_sample_index_at_time(time, mode)
+
+    def get_ops(self, sample_index=0):
+        prop = self._get_xform_property(".ops")
+        if prop is None:
+            return []
+        return list(bytes(prop.get_sample(self._get_clamped_index(prop, sample_index))))
+
+    def get_inherits(self, sample_index=0):
+        prop = self._get_xform_property(".inherits")
+        if prop is None:
+            return True
+        return bool(prop.get_sample(self._get_clamped_index(prop, sample_index))[0])
+
+    def get_vals(self, sample_index=0):
+        import numpy
+
+        prop = self._get_xform_property(".vals")
+        if prop is None:
+            return numpy.empty(0)
+        return numpy.ravel(
+            prop.get_decoded_sample(self._get_clamped_index(prop, sample_index))
+        )
+
+    def get_matrix(self, sample_index=0):
+        import numpy
+
+        return _compose_matrix(
+            numpy, self.get_ops(sample_index), self.get_vals(sample_index)
+        )
+
+    def get_interpolated_matrix(self, time):
+        import numpy
+
+        floor_index = self.get_sample_index_at_time(time, "floor") or 0
+        ceil_index = self.get_sample_index_at_time(time, "ceil") or 0
+        ops = self.get_ops(floor_index)
+        vals = self.get_vals(floor_index)
+        prop = self._get_xform_property(".vals")
+        if prop is None or floor_index == ceil_index or self.get_ops(ceil_index) != ops:
+            return _compose_matrix(numpy, ops, vals)
+        ceil_vals = self.get_vals(ceil_index)
+        # the operation stack changed, there is nothing to blend
+        if ceil_vals.shape != vals.shape:
+            return _compose_matrix(numpy, ops, vals)
+
+        floor_time = prop.get_sample_time(floor_index)
+        weight = (time - floor_time) / (prop.get_sample_time(ceil_index) - floor_time)
+        blended = vals + (ceil_vals - vals) * weight
+        offset = 0
+        for op in ops:
+            operation_type = op >> 4
+            if operation_type == XFORM_ROTATE:
+                # axis/angle rotations are blended along the shortest arc
+                rotation = slice(offset, offset + 4)
+                quaternion = slerp_quaternions(
+                    numpy,
+                    _axis_angle_quaternion(numpy, vals[rotation]),
+                    _axis_angle_quaternion(numpy, ceil_vals[rotation]),
+                    weight,
+                    numpy.empty((1, 4)),
+                )
+                blended[rotation] = _quaternion_axis_angle(numpy, quaternion[0])
+            offset += XFORM_OPERATION_CHANNELS[operation_type]
+        return _compose_matrix(numpy, ops, blended)
+
+    def get_child_bounds(self, sample_index=0):
+        import numpy
+
+        prop = self._get_xform_property(".childBnds")
+        if prop is None:
+            return None
+        return numpy.array(
+            prop.get_decoded_sample(self._get_clamped_index(prop, sample_index)),
+            dtype=numpy.float64,
+        ).reshape(6)
@@ -0,0 +1,123 @@
+from collections import OrderedDict
+import threading
+
+
+class StorageException(Exception):
+    pass
+
+
+class FileStorage:
+    def __init__(self, handle):
+        # any seekable file object works, including remote file
+        # implementations exposing the standard io interface
+        self.handle = handle
+        self._lock = threading.Lock()
+        with self._lock:
+            self.size = handle.seek(0, 2)
+        self._owned = False
+
+    @staticmethod
+    def from_filename(filename):
+        storage = FileStorage(open(filename, "rb"))
+        storage._owned = True
+        return storage
+
+    def read(self, offset, size):
+        if offset < 0 or size < 0 or offset + size > self.size:
+            raise StorageException(
+                "Invalid range {}-{} (size {})".format(offset, offset + size, self.size)
+            )
+        with self._lock:
+            self.handle.seek(offset)
+            data = self.handle.read(size)
+        if len(data) != size:
+            raise StorageException("Short read at {}".format(offset))
+        return data
+
+    def close(self):
+        if self._owned:
+            self.handle.close()
+
+
+def _get_runs(indices):
+    runs = []
+    for i in indices:
+        if runs and runs[-1][1] == i - 1:
+            runs[-1][1] = i
+        else:
+            runs.append([i, i])
+    return runs
+
+
+class CachedStorage:
+    def __init__(self, source, block_size=64 * 1024, max_blocks=1024):
+        self.source = source
+        self.size = source.size
+        self.block_size = block_size
+        self.max_blocks = max_blocks
+        self.hits = 0
+        self.misses = 0
+        self._blocks = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get_blocks(self, first, last):
+        blocks = {}
+        with self._lock:
+            for i in range(first, last + 1):
+                block = self._blocks.get(i)
+                if block is not None:
+                    self._blocks.move_to_end(i)
+                    blocks[i] = block
+            self.hits += len(blocks)
+        missing = [i for i in range(first, last + 1) if i not in blocks]
+        if not missing:
+            return blocks
+
+        # adjacent missing blocks are fetched with a single request
+        for run_first, run_last in _get_runs(missing):
+            start = run_first * self.block_size
+            end = min((run_last + 1) * self.block_size, self.size)
+            data = memoryview(self.source.read(start, end - start))
+            for i in range(run_first, run_last + 1):
+                offset = (i - run_first) * self.block_size
+                blocks[i] = bytes(data[offset : offset + self.block_size])
+
+        with self._lock:
+            self.misses += len(missing)
+            for i in missing:
+                self._blocks[i] = blocks[i]
+            # evict the least recently used blocks
+            while len(self._blocks) > self.max_blocks:
+                self._blocks.popitem(last=False)
+        return blocks
+
+    def read(self, offset, size):
+        if offset < 0 or size < 0 or offset + size > self.size:
+            raise StorageException(
+                "Invalid range {}-{} (size {})".format(offset, offset + size, self.size)
+            )
+        if size == 0:
+            return memoryview(b"")
+        first = offset // self.block_size
+        last = (offset + size - 1) // self.block_size
+        blocks = self._get_blocks(first, last)
+        start = offset - first * self.block_size
+        if first == last:
+            return memoryview(blocks[first])[start : start + size]
+        data = b"".join(blocks[i] for i in range(first, last + 1))
+        return memoryview(data)[start : start + size]
+
+    def prefetch(self, offset, size):
+        if size > 0:
+            self._get_blocks(
+                offset // self.block_size,
+                (min(offset + size, self.size) - 1) // self.block_size,
+            )
+
+    def clear(self):
+        with self._lock:
+            self._blocks.clear()
+
+    def close(self):
+        self.clear()
+        self.source.close()
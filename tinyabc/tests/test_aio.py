@@ -0,0 +1,88 @@
+import asyncio
+import unittest
+from tinyabc.aio import AsyncArchive, AsyncProperty
+from .utils import get_fixture
+
+try:
+    import numpy
+
+    has_numpy = True
+except ImportError:
+    has_numpy = False
+
+
+class TestAsyncArchive(unittest.IsolatedAsyncioTestCase):
+
+    async def test_open(self):
+        async with await AsyncArchive.open(
+            get_fixture("test_blender_cube.abc")
+        ) as archive:
+            self.assertEqual(archive.archive.version, 0)
+            self.assertEqual(await archive.paths(), archive.archive.paths())
+            cube = await archive.get_object("/Cube")
+            self.assertEqual(cube.name, "Cube")
+            self.assertEqual(
+                [child.name for child in await archive.root.get_children()], ["Cube"]
+            )
+            geom = await (await (await archive["/Cube/Cube_001"]).get_properties())[
+                ".geom"
+            ]
+            self.assertIn("P", [child.name for child in await geom.get_children()])
+            self.assertIsInstance(await geom["P"], AsyncProperty)
+
+    async def test_get_sample(self):
+        archive = await AsyncArchive.open(get_fixture("test_blender_vertexanim.abc"))
+        mesh = await archive["/Cube/Cube_003"]
+        prop = await mesh.get_property(".geom/P")
+        self.assertIsInstance(prop, AsyncProperty)
+        self.assertEqual(prop.num_samples, 31)
+        self.assertEqual(
+            bytes(await prop.aget_sample(3)),
+            bytes(prop.property.get_sample(3)),
+        )
+        self.assertIsNone(await prop.aget_decoded_sample(31))
+
+    @unittest.skipIf(not has_numpy, "numpy not available")
+    async def test_coalesce(self):
+        archive = await AsyncArchive.open(
+            get_fixture("test_blender_vertexanim.abc"), max_concurrency=2
+        )
+        mesh = await archive.get_object("/Cube/Cube_003")
+        prop = await mesh.get_property(".geom/P")
+        samples = await asyncio.gather(*(prop.aget_decoded_sample(5) for i in range(8)))
+        # all the requests were served by a single decode
+        self.assertEqual(archive.archive.sample_cache.misses, 1)
+        self.assertEqual(archive.archive.sample_cache.hits, 0)
+        for sample in samples:
+            self.assertIs(sample, samples[0])
+        calls = []
+
+        def encoder(sample):
+            calls.append(sample)
+            return bytes(sample)
+
+        samples = await asyncio.gather(
+            *(prop.aget_sample(5, encoder) for i in range(8))
+        )
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(samples, [samples[0]] * 8)
+        self.assertEqual(archive._pending, {})
+
+    @unittest.skipIf(not has_numpy, "numpy not available")
+    async def test_iterators(self):
+        archive = await AsyncArchive.open(get_fixture("test_blender_vertexanim.abc"))
+        mesh = await archive["/Cube/Cube_003"]
+        prop = await mesh.get_property(".geom/P")
+        expected = prop.property.read_samples()
+        samples = [sample.tolist() async for sample in prop.aiter_samples(prefetch=4)]
+        self.assertEqual(samples, expected.tolist())
+        frames = [
+            frame
+            async for frame in mesh.aiter_frames([".geom/P", ".geom/.faceIndices"])
+        ]
+        self.assertEqual(len(frames), 31)
+        self.assertEqual(frames[30][".geom/P"].tolist(), expected[30].tolist())
+        self.assertEqual(
+            frames[30][".geom/.faceIndices"].tolist(),
+            frames[0][".geom/.faceIndices"].tolist(),
+        )
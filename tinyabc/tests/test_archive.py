@@ -1,6 +1,19 @@
 import unittest
-from tinyabc.archive import Archive
-from .utils import get_fixture, struct_property_encoder
+from tinyabc.archive import Archive, ArchiveException
+from tinyabc.ogawa import Ogawa
+from tinyabc.parallel import ParallelException
+from .utils import get_fixture, struct_property_encoder, write_archive
+
+try:
+    import numpy
+
+    has_numpy = True
+except ImportError:
+    has_numpy = False
+
+
+def sample_bounds(sample):
+    return numpy.stack((sample.min(axis=0), sample.max(axis=0)))
 
 
 class TestArchive(unittest.TestCase):
@@ -127,6 +140,40 @@ class TestArchive(unittest.TestCase):
             "Node_001_001_002_001",
         )
 
+    def test_blender_tree_lazy_lookup(self):
+        archive = Archive.from_filename(get_fixture("test_blender_tree.abc"))
+        self.assertIsNone(archive.root._children)
+        node = archive["/Node_001/Node_001_001"]
+        self.assertEqual(node.name, "Node_001_001")
+        self.assertIsNone(node._children)
+        self.assertIsNone(node._properties)
+        for sibling in archive.root.children[:2]:
+            self.assertIsNone(sibling._children)
+            self.assertIsNone(sibling._properties)
+        self.assertIsNone(archive.root["Node_001"]._properties)
+
+    def test_blender_tree_paths(self):
+        archive = Archive.from_filename(get_fixture("test_blender_tree.abc"))
+        paths = archive.paths()
+        self.assertEqual(len(paths), 9)
+        self.assertIn("/Node_003/Node_003_001", paths)
+        self.assertIn(
+            "/Node_001/Node_001_001/Node_001_001_002/Node_001_001_002_001", paths
+        )
+        self.assertIs(archive["/Node_003/Node_003_001"], archive.root[1][0])
+
+    def test_blender_tree_find(self):
+        archive = Archive.from_filename(get_fixture("test_blender_tree.abc"))
+        self.assertEqual(
+            [item.name for item in archive.find("/Node_001/Node_001_001/*")],
+            ["Node_001_001_001", "Node_001_001_002", "Node_001_001_003"],
+        )
+        self.assertEqual(
+            [item.name for item in archive.find("/*/*_001")],
+            ["Node_003_001", "Node_001_001"],
+        )
+        self.assertEqual(archive.find("/Node_004"), [])
+
     def test_blender_tree_wrong_path(self):
         archive = Archive.from_filename(get_fixture("test_blender_tree.abc"))
         self.assertRaises(
@@ -188,3 +235,133 @@ class TestArchive(unittest.TestCase):
             "test002"
             in tree["children"][0]["properties"][".xform"][".userProperties"].keys()
         )
+
+    @unittest.skipIf(not has_numpy, "numpy not available")
+    def test_blender_map_samples(self):
+        archive = Archive.from_filename(get_fixture("test_blender_vertexanim.abc"))
+        geom = archive["/Cube/Cube_003"].properties[".geom"]
+        expected = [sample_bounds(sample) for sample in geom["P"].read_samples()]
+        for workers in (1, 2):
+            results = archive.map_samples(
+                sample_bounds, ["/Cube/Cube_003"], [".geom/P"], workers=workers
+            )
+            self.assertEqual(list(results.keys()), [("/Cube/Cube_003", ".geom/P")])
+            bounds = results[("/Cube/Cube_003", ".geom/P")]
+            self.assertEqual(bounds.shape, (31, 2, 3))
+            self.assertEqual(bounds.tolist(), numpy.array(expected).tolist())
+
+    @unittest.skipIf(not has_numpy, "numpy not available")
+    def test_map_samples_in_memory(self):
+        with open(get_fixture("test_blender_vertexanim.abc"), "rb") as handle:
+            archive = Archive.from_buffer(handle.read())
+        with self.assertRaises(ArchiveException):
+            archive.map_samples(sample_bounds, ["/Cube/Cube_003"], [".geom/P"])
+        results = archive.map_samples(
+            sample_bounds, ["/Cube/Cube_003"], [".geom/P"], workers=1
+        )
+        self.assertEqual(results[("/Cube/Cube_003", ".geom/P")].shape, (31, 2, 3))
+
+    @unittest.skipIf(not has_numpy, "numpy not available")
+    def test_map_samples_from_tree(self):
+        filename = get_fixture("test_blender_cube.abc")
+        # every node of a tree built archive has offset 0
+        archive = Archive.from_tree(Ogawa.from_filename(filename).totree(bytes))
+        results = archive.map_samples(
+            sample_bounds, ["/Cube/Cube_001"], [".geom/P"], workers=1
+        )
+        expected = Archive.from_filename(filename).map_samples(
+            sample_bounds, ["/Cube/Cube_001"], [".geom/P"], workers=1
+        )
+        self.assertEqual(
+            results[("/Cube/Cube_001", ".geom/P")].tolist(),
+            expected[("/Cube/Cube_001", ".geom/P")].tolist(),
+        )
+
+    @unittest.skipIf(not has_numpy, "numpy not available")
+    def test_map_samples_shape_mismatch(self):
+        archive = Archive.from_filename(get_fixture("test_blender_vertexanim.abc"))
+        calls = []
+
+        def grow(sample):
+            calls.append(sample)
+            return numpy.zeros(len(calls))
+
+        with self.assertRaises(ParallelException):
+            archive.map_samples(
+                grow,
+                ["/Cube/Cube_003"],
+                [".geom/P"],
+                workers=1,
+            )
+
+    @unittest.skipIf(not has_numpy, "numpy not available")
+    def test_blender_iter_frames(self):
+        archive = Archive.from_filename(get_fixture("test_blender_vertexanim.abc"))
+        mesh = archive["/Cube/Cube_003"]
+        frames = list(mesh.iter_frames([".geom/P", ".geom/.faceIndices"]))
+        self.assertEqual(len(frames), 31)
+        points = mesh.properties[".geom"]["P"].read_samples()
+        face_indices = mesh.properties[".geom"][".faceIndices"].get_decoded_sample(0)
+        for frame, frame_samples in enumerate(frames):
+            self.assertEqual(frame_samples[".geom/P"].tolist(), points[frame].tolist())
+            self.assertEqual(
+                frame_samples[".geom/.faceIndices"].tolist(), face_indices.tolist()
+            )
+        frames = list(mesh.iter_frames(start=30, prefetch=0))
+        self.assertEqual(len(frames), 1)
+        self.assertIn(".geom/P", frames[0])
+        self.assertIn(".geom/.selfBnds", frames[0])
+
+    @unittest.skipIf(not has_numpy, "numpy not available")
+    def test_blender_world_matrices(self):
+        archive = Archive.from_filename(get_fixture("test_blender_anim.abc"))
+        self.assertEqual(
+            archive.paths(),
+            ["/MovingNode", "/MovingNode/Child001", "/MovingNode/Child002"],
+        )
+        world = archive.world_matrices(4)
+        self.assertEqual(world.shape, (3, 4, 4))
+        self.assertEqual(world[0, 3].tolist(), [0.0, 5.0, 0.0, 1.0])
+        self.assertEqual(world[1, 3].tolist(), [10.0, 5.0, 0.0, 1.0])
+        self.assertEqual(world[2, 3].tolist(), [0.0, 5.0, -10.0, 1.0])
+        # results are cached per frame and read only
+        self.assertIs(archive.world_matrices(4), world)
+        self.assertFalse(world.flags.writeable)
+        by_time = archive.world_matrices(5 / 24)
+        self.assertEqual(by_time[1, 3].tolist(), [10.0, 3.0, 0.0, 1.0])
+
+    @unittest.skipIf(not has_numpy, "numpy not available")
+    def test_blender_vertex_anim_bounds_table(self):
+        archive = Archive.from_filename(get_fixture("test_blender_vertexanim.abc"))
+        self.assertEqual(archive.paths(), ["/Cube", "/Cube/Cube_003", "/Empty"])
+        table = archive.bounds_table([0, 10, 10 / 24])
+        self.assertEqual(table.shape, (3, 3, 6))
+        # only geometry has bounds, transforms are left as nan
+        self.assertTrue(numpy.isnan(table[0]).all())
+        self.assertTrue(numpy.isnan(table[2]).all())
+        mesh = archive["/Cube/Cube_003"].to_schema()
+        self.assertEqual(table[1, 1].tolist(), mesh.get_self_bounds(10).tolist())
+        self.assertEqual(
+            table[1, 2].tolist(),
+            mesh.get_self_bounds(mesh.get_sample_index_at_time(10 / 24)).tolist(),
+        )
+        self.assertEqual(archive.bounds_table().shape, (3, 1, 6))
+
+    @unittest.skipIf(not has_numpy, "numpy not available")
+    def test_world_matrices_inherits(self):
+        def callback(writer):
+            for path, inherits in (("/A", True), ("/A/B", False), ("/A/B/C", True)):
+                writer.add_object(path, schema="AbcGeom_Xform_v3")
+                writer.add_property(path, ".xform/.inherits", "?", array=False)
+                writer.add_property(path, ".xform/.ops", "B", array=False)
+                writer.add_property(path, ".xform/.vals", "d", extent=3, array=False)
+                writer.write_sample(path, ".xform/.inherits", inherits)
+                writer.write_sample(path, ".xform/.ops", 0x10)
+                writer.write_sample(path, ".xform/.vals", (1, 0, 0))
+            writer.add_object("/A/B/C/Mesh", schema="AbcGeom_PolyMesh_v1")
+
+        world = write_archive(callback).world_matrices()
+        self.assertEqual(
+            world[:, 3, 0].tolist(),
+            [1.0, 1.0, 2.0, 2.0],
+        )
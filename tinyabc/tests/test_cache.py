@@ -0,0 +1,37 @@
+import unittest
+from tinyabc.cache import SampleCache
+
+
+class TestCache(unittest.TestCase):
+
+    def test_hits_and_misses(self):
+        cache = SampleCache()
+        self.assertIsNone(cache.get("a"))
+        cache.put("a", 1, 10)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertEqual(cache.size, 10)
+
+    def test_lru_eviction(self):
+        cache = SampleCache(max_size=30)
+        cache.put("a", 1, 10)
+        cache.put("b", 2, 10)
+        cache.put("c", 3, 10)
+        cache.get("a")
+        cache.put("d", 4, 10)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(len(cache), 3)
+        self.assertEqual(cache.size, 30)
+
+    def test_too_big(self):
+        cache = SampleCache(max_size=5)
+        cache.put("a", 1, 10)
+        self.assertEqual(len(cache), 0)
+
+    def test_clear(self):
+        cache = SampleCache()
+        cache.put("a", 1, 10)
+        cache.get("a")
+        cache.clear()
+        self.assertEqual((len(cache), cache.size, cache.hits), (0, 0, 0))
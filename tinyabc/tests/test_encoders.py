@@ -0,0 +1,80 @@
+import unittest
+from tinyabc.archive import Archive
+from tinyabc.encoders import numpy_property
+from .utils import get_fixture, struct_property_encoder
+
+try:
+    import numpy
+
+    has_numpy = True
+except ImportError:
+    has_numpy = False
+
+
+class FakeProperty:
+    def __init__(self, pod_type_format, extent=1):
+        self.pod_type_format = pod_type_format
+        self.extent = extent
+
+
+@unittest.skipIf(not has_numpy, "numpy not available")
+class TestEncoders(unittest.TestCase):
+
+    def test_pod_types(self):
+        for pod_type_format, dtype in (
+            ("?", numpy.bool_),
+            ("B", numpy.uint8),
+            ("b", numpy.int8),
+            ("H", numpy.uint16),
+            ("h", numpy.int16),
+            ("I", numpy.uint32),
+            ("i", numpy.int32),
+            ("Q", numpy.uint64),
+            ("q", numpy.int64),
+            ("e", numpy.float16),
+            ("f", numpy.float32),
+            ("d", numpy.float64),
+        ):
+            np_array = numpy_property(FakeProperty(pod_type_format, 2), bytes(32))
+            self.assertEqual(np_array.dtype, dtype)
+            self.assertEqual(np_array.shape, (16 // dtype().itemsize, 2))
+
+    def test_strings(self):
+        self.assertEqual(
+            numpy_property(
+                FakeProperty("string"), b"hello\x00\x00w\xc3\xa8rld\x00"
+            ).tolist(),
+            ["hello", "", "w\xe8rld"],
+        )
+        self.assertEqual(
+            numpy_property(
+                FakeProperty("wstring"), "ab\x00\x00xyz\x00".encode("utf-32-le")
+            ).tolist(),
+            ["ab", "", "xyz"],
+        )
+        self.assertEqual(numpy_property(FakeProperty("string"), b"").tolist(), [])
+
+    def test_blender_custom_properties(self):
+        archive = Archive.from_filename(
+            get_fixture("test_blender_light_with_custom_properties.abc")
+        )
+        properties = archive["/Point"].properties[".xform"][".userProperties"]
+        for name in ("test001", "test002", "prop_001"):
+            prop = properties[name]
+            self.assertEqual(
+                numpy_property(prop, prop.get_sample(0), 0).tolist(),
+                struct_property_encoder(prop)[0],
+            )
+
+    def test_blender_xform_vals(self):
+        archive = Archive.from_filename(get_fixture("test_blender_anim.abc"))
+        prop = archive["/MovingNode"].properties[".xform"][".vals"]
+        np_array = numpy_property(prop, prop.get_sample(4))
+        self.assertEqual(np_array.dtype, numpy.float64)
+        self.assertEqual(np_array.shape, (1, 16))
+        self.assertEqual(np_array[0, 13], 5.0)
+
+    def test_blender_array_shape(self):
+        archive = Archive.from_filename(get_fixture("test_blender_vertexanim.abc"))
+        prop = archive["/Cube/Cube_003"].properties[".geom"]["P"]
+        self.assertEqual(numpy_property(prop, prop.get_sample(3), 3).shape, (8, 3))
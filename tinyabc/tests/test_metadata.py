@@ -0,0 +1,65 @@
+import io
+import unittest
+from tinyabc.archive import Archive
+from tinyabc.metadata import MetadataException, parse_metadata, serialize_metadata
+from tinyabc.ogawa import Ogawa
+from tinyabc.writer import ArchiveWriter
+
+
+class TestMetadata(unittest.TestCase):
+
+    def test_parse(self):
+        self.assertEqual(parse_metadata(b""), {})
+        self.assertEqual(
+            parse_metadata(b"schema=AbcGeom_Xform_v3;;interpretation=matrix"),
+            {"schema": "AbcGeom_Xform_v3", "interpretation": "matrix"},
+        )
+
+    def test_parse_key_separator_in_value(self):
+        self.assertEqual(
+            parse_metadata(b"expression=a=b+1;key="), {"expression": "a=b+1", "key": ""}
+        )
+
+    def test_backslashes(self):
+        metadata = {"k": "v\\", "path": "C:\\temp\\", "schema": "AbcGeom_PolyMesh_v1"}
+        blob = serialize_metadata(metadata)
+        self.assertEqual(blob, rb"k=v\;path=C:\temp\;schema=AbcGeom_PolyMesh_v1")
+        self.assertEqual(parse_metadata(blob), metadata)
+
+    def test_serialize_separators(self):
+        for metadata in ({"a;b": "c"}, {"a": "c;d"}, {"e=f": "g"}, {"e": "g=h"}):
+            with self.assertRaises(MetadataException):
+                serialize_metadata(metadata)
+
+    def test_backslash_round_trip(self):
+        handle = io.BytesIO()
+        with ArchiveWriter(handle) as writer:
+            writer.add_object(
+                "/Mesh", schema="AbcGeom_PolyMesh_v1", metadata={"k": "v\\"}
+            )
+        mesh = Archive.from_buffer(handle.getvalue())["/Mesh"]
+        self.assertEqual(mesh.metadata["k"], "v\\")
+        self.assertEqual(mesh.metadata["schema"], "AbcGeom_PolyMesh_v1")
+
+    def test_immutable(self):
+        metadata = parse_metadata(b"schema=AbcGeom_Xform_v3")
+        with self.assertRaises(TypeError):
+            metadata["schema"] = "AbcGeom_PolyMesh_v1"
+
+    def test_shared_indexed_metadata(self):
+        handle = io.BytesIO()
+        with ArchiveWriter(handle) as writer:
+            for i in range(3):
+                writer.add_object("/Node{}".format(i), schema="AbcGeom_Xform_v3")
+        archive = Archive.from_buffer(handle.getvalue())
+        nodes = archive.root.children
+        self.assertEqual(nodes[0].metadata, {"schema": "AbcGeom_Xform_v3"})
+        self.assertIs(nodes[0].metadata, nodes[1].metadata)
+        self.assertIs(nodes[0].metadata, nodes[2].metadata)
+
+    def test_split_and_encode(self):
+        ogawa = Ogawa.from_tree([b"a=1;b=2;;c"])
+        self.assertEqual(
+            list(ogawa.root.children[0].split_and_encode(b";", bytes)),
+            [b"a=1", b"b=2", b"", b"c"],
+        )
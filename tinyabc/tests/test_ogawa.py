@@ -1,5 +1,9 @@
+import io
+import mmap
+import os.path
+import tempfile
 import unittest
-from tinyabc.ogawa import Ogawa
+from tinyabc.ogawa import Ogawa, OgawaWriter
 from .utils import get_fixture
 
 
@@ -171,3 +175,82 @@ class TestOgawa(unittest.TestCase):
                 b"\x17schema=AbcGeom_Xform_v3>schema=AbcGeom_Xform_v3;schemaObjTitle=AbcGeom_Xform_v3:.xform",
             ],
         )
+
+    def test_mmap_from_filename(self):
+        with Ogawa.from_filename(get_fixture("test_ogawa_simple.abc")) as ogawa:
+            self.assertIsInstance(ogawa.data, mmap.mmap)
+            self.assertIs(ogawa.root.children[3].view.obj, ogawa.data)
+            self.assertEqual(ogawa.root.children[2].children[2].size, 47)
+        self.assertRaises(ValueError, ogawa.view.__getitem__, 0)
+
+    def test_no_mmap_from_filename(self):
+        ogawa = Ogawa.from_filename(
+            get_fixture("test_ogawa_simple.abc"), use_mmap=False
+        )
+        self.assertIsInstance(ogawa.data, bytes)
+        ogawa.close()
+        self.assertEqual(ogawa.root.children[3].size, 61)
+
+    def test_mmap_close_with_live_views(self):
+        ogawa = Ogawa.from_filename(get_fixture("test_ogawa_simple.abc"))
+        view = ogawa.root.children[3].view
+        ogawa.close()
+        self.assertEqual(bytes(view[0:7]), b"_ai_Ale")
+
+    def test_lazy_group(self):
+        ogawa = Ogawa.from_filename(get_fixture("test_ogawa_simple.abc"))
+        self.assertIsNone(ogawa.root.nodes)
+        self.assertEqual(len(ogawa.root), 6)
+        self.assertTrue(ogawa.root.is_data(0))
+        self.assertTrue(ogawa.root.is_group(2))
+        self.assertTrue(ogawa.root.is_data(-1))
+        self.assertEqual(ogawa.root[-3].offset, ogawa.root[3].offset)
+        self.assertEqual(
+            [child.size for child in ogawa.root[3:6]],
+            [61, 24, 87],
+        )
+        self.assertRaises(IndexError, ogawa.root.__getitem__, 6)
+        self.assertRaises(IndexError, ogawa.root.is_group, -7)
+
+    def test_lazy_group_serialize(self):
+        ogawa = Ogawa.from_filename(get_fixture("test_blender_tree.abc"))
+        ogawa_copy = Ogawa(ogawa.serialize())
+        self.assertEqual(ogawa_copy.totree(encoder=bytes), ogawa.totree(encoder=bytes))
+
+    def test_serialize_optimize(self):
+        ogawa = Ogawa.from_filename(get_fixture("test_blender_tree.abc"))
+        blob = ogawa.serialize()
+        optimized_blob = ogawa.serialize(optimize=True)
+        self.assertLess(len(optimized_blob), len(blob))
+        self.assertEqual(
+            Ogawa(optimized_blob).totree(encoder=bytes), ogawa.totree(encoder=bytes)
+        )
+
+    def test_serialize_optimize_shared_data(self):
+        ogawa = Ogawa.from_tree([b"hello", [b"hello", b"", []], b"world"])
+        ogawa_copy = Ogawa(ogawa.serialize(optimize=True))
+        self.assertEqual(ogawa_copy.totree(), [b"hello", [b"hello", b"", []], b"world"])
+        self.assertEqual(ogawa_copy.root[0].offset, ogawa_copy.root[1][0].offset)
+        self.assertEqual(ogawa_copy.root[1][1].offset, 0)
+        self.assertEqual(ogawa_copy.root[1][2].offset, 0)
+
+    def test_writer(self):
+        handle = io.BytesIO()
+        writer = OgawaWriter(handle)
+        hello = writer.write_data(b"hello")
+        group = writer.write_group([hello, writer.write_data(b"world")])
+        self.assertEqual(handle.getvalue()[5], 0)
+        writer.close([group, hello])
+        ogawa = Ogawa(handle.getvalue())
+        self.assertEqual(ogawa.wflag, 0xFF)
+        self.assertEqual(ogawa.totree(encoder=bytes), [[b"hello", b"world"], b"hello"])
+
+    def test_writer_to_filename(self):
+        ogawa = Ogawa.from_filename(get_fixture("test_blender_cube.abc"))
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "test.abc")
+            ogawa.to_filename(filename, optimize=True)
+            with Ogawa.from_filename(filename) as ogawa_copy:
+                self.assertEqual(
+                    ogawa_copy.totree(encoder=bytes), ogawa.totree(encoder=bytes)
+                )
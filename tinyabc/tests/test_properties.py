@@ -1,6 +1,18 @@
+import math
+import struct
 import unittest
 from tinyabc.archive import Archive
-from .utils import get_fixture, struct_property_encoder
+from tinyabc.ogawa import Ogawa
+from tinyabc.properties import ArrayProperty
+from tinyabc.sampling import TimeSampling
+from .utils import get_fixture, struct_property_encoder, write_archive_data
+
+try:
+    import numpy
+
+    has_numpy = True
+except ImportError:
+    has_numpy = False
 
 
 class TestProperties(unittest.TestCase):
@@ -226,3 +238,185 @@ class TestProperties(unittest.TestCase):
                 }
             },
         )
+
+    @unittest.skipIf(not has_numpy, "numpy not available")
+    def test_blender_read_samples(self):
+        archive = Archive.from_filename(get_fixture("test_blender_vertexanim.abc"))
+        geom = archive["/Cube/Cube_003"].properties[".geom"]
+        samples = geom["P"].read_samples()
+        self.assertEqual(samples.shape, (31, 8, 3))
+        self.assertEqual(samples.dtype, numpy.float32)
+        self.assertEqual(
+            samples.tolist(),
+            [
+                [list(item) for item in sample]
+                for sample in struct_property_encoder(geom["P"])
+            ],
+        )
+        self.assertEqual(
+            geom["P"].read_samples(10, 20, 3).tolist(), samples[10:20:3].tolist()
+        )
+        empty = geom["P"].read_samples(5, 5)
+        self.assertEqual(empty.shape, (0, 8, 3))
+        self.assertEqual(empty.dtype, numpy.float32)
+
+    @unittest.skipIf(not has_numpy, "numpy not available")
+    def test_blender_iter_samples(self):
+        archive = Archive.from_filename(get_fixture("test_blender_vertexanim.abc"))
+        prop = archive["/Cube/Cube_003"].properties[".geom"]["P"]
+        samples = prop.read_samples()
+        for prefetch in (0, 1, 4):
+            self.assertEqual(
+                [sample.tolist() for sample in prop.iter_samples(prefetch=prefetch)],
+                samples.tolist(),
+            )
+        self.assertEqual(
+            [sample.tolist() for sample in prop.iter_samples(5, 8)],
+            samples[5:8].tolist(),
+        )
+        # stopping early does not leave pending work behind
+        iterator = prop.iter_samples(prefetch=4)
+        self.assertEqual(next(iterator).tolist(), samples[0].tolist())
+        iterator.close()
+
+    @unittest.skipIf(not has_numpy, "numpy not available")
+    def test_blender_read_samples_constant(self):
+        archive = Archive.from_filename(get_fixture("test_blender_vertexanim.abc"))
+        geom = archive["/Cube/Cube_003"].properties[".geom"]
+        samples = geom[".faceIndices"].read_samples()
+        self.assertEqual(samples.shape, (31, 24))
+        self.assertEqual(samples.strides[0], 0)
+
+    @unittest.skipIf(not has_numpy, "numpy not available")
+    def test_blender_read_samples_scalar(self):
+        archive = Archive.from_filename(get_fixture("test_blender_anim.abc"))
+        samples = archive["/MovingNode"].properties[".xform"][".vals"].read_samples()
+        self.assertEqual(samples.shape, (6, 16))
+        self.assertEqual(
+            samples[:, 13].tolist(),
+            [0.0, 0.0, 1.2962963581085205, 3.7037036418914795, 5.0, 3.0],
+        )
+        empty = archive["/MovingNode"].properties[".xform"][".vals"].read_samples(3, 3)
+        self.assertEqual(empty.shape, (0, 16))
+        self.assertEqual(empty.dtype, numpy.float64)
+
+    @unittest.skipIf(not has_numpy, "numpy not available")
+    def test_read_samples_ragged(self):
+        ogawa = Ogawa.from_tree(
+            [
+                bytes(16) + struct.pack("<3i", 1, 2, 3),
+                b"",
+                bytes(16) + struct.pack("<2i", 4, 5),
+                b"",
+            ]
+        )
+        prop = ArrayProperty("test", "i", 1, 3, 1, 1, {}, ogawa.root)
+        values, offsets = prop.read_samples()
+        self.assertEqual(values.tolist(), [1, 2, 3, 4, 5, 4, 5])
+        self.assertEqual(offsets.tolist(), [0, 3, 5, 7])
+
+    @unittest.skipIf(not has_numpy, "numpy not available")
+    def test_blender_get_interpolated(self):
+        archive = Archive.from_filename(get_fixture("test_blender_vertexanim.abc"))
+        prop = archive["/Cube/Cube_003"].properties[".geom"]["P"]
+        samples = prop.read_samples()
+        time = prop.get_sample_time(3) * 0.25 + prop.get_sample_time(4) * 0.75
+        out = numpy.zeros((8, 3), dtype=numpy.float32)
+        self.assertIs(prop.get_interpolated(time, out=out), out)
+        numpy.testing.assert_allclose(out, samples[3] * 0.25 + samples[4] * 0.75)
+        self.assertEqual(
+            prop.get_interpolated(prop.get_sample_time(30)).tolist(),
+            samples[30].tolist(),
+        )
+        # an exact time returns a writable array that can be reused as output
+        out = prop.get_interpolated(prop.get_sample_time(3))
+        self.assertTrue(out.flags.writeable)
+        self.assertIs(prop.get_interpolated(time, out=out), out)
+        numpy.testing.assert_allclose(out, samples[3] * 0.25 + samples[4] * 0.75)
+        self.assertEqual(
+            prop.get_interpolated(prop.get_sample_time(3)).tolist(),
+            samples[3].tolist(),
+        )
+
+    @unittest.skipIf(not has_numpy, "numpy not available")
+    def test_get_interpolated_topology_change(self):
+        ogawa = Ogawa.from_tree(
+            [
+                bytes(16) + struct.pack("<3f", 1, 2, 3),
+                b"",
+                bytes(16) + struct.pack("<2f", 4, 5),
+                b"",
+            ]
+        )
+        prop = ArrayProperty(
+            "test", "f", 1, 2, 1, 1, {}, ogawa.root, TimeSampling(2, 1.0, [0.0])
+        )
+        self.assertEqual(prop.get_interpolated(0.5).tolist(), [1, 2, 3])
+
+    @unittest.skipIf(not has_numpy, "numpy not available")
+    def test_get_interpolated_slerp(self):
+        half = math.sqrt(0.5)
+        ogawa = Ogawa.from_tree(
+            [
+                bytes(16) + struct.pack("<4f", 0, 0, 0, 1),
+                b"",
+                bytes(16) + struct.pack("<4f", 0, 0, -half, -half),
+                b"",
+            ]
+        )
+        prop = ArrayProperty(
+            "test", "f", 4, 2, 1, 1, {}, ogawa.root, TimeSampling(2, 1.0, [0.0])
+        )
+        numpy.testing.assert_allclose(
+            prop.get_interpolated(0.5, slerp=True),
+            [[0, 0, math.sin(math.pi / 8), math.cos(math.pi / 8)]],
+            atol=1e-6,
+        )
+
+    def test_blender_sample_key(self):
+        archive = Archive.from_filename(get_fixture("test_blender_vertexanim.abc"))
+        geom = archive["/Cube/Cube_003"].properties[".geom"]
+        self.assertEqual(
+            geom["P"].get_sample_key(0).hex(), "18802db5ba8005376023afef649d99eb"
+        )
+        self.assertNotEqual(geom["P"].get_sample_key(0), geom["P"].get_sample_key(30))
+        self.assertEqual(
+            geom["P"].get_sample_key(0),
+            geom[".arbGeomParams"]["Pref"].get_sample_key(0),
+        )
+        self.assertIsNone(geom["P"].get_sample_key(31))
+
+    @unittest.skipIf(not has_numpy, "numpy not available")
+    def test_shared_decoded_samples_are_read_only(self):
+        def callback(writer):
+            for path in ("/A", "/B"):
+                writer.add_object(path)
+                writer.add_property(path, "names", "string")
+                writer.add_property(path, "v", "f")
+                writer.write_sample(path, "names", ["x", "y"])
+                writer.write_sample(path, "v", [1, 2])
+
+        # bytearray backed archives decode into writable views
+        archive = Archive.from_buffer(bytearray(write_archive_data(callback)))
+        for name in ("names", "v"):
+            sample = archive["/A"].properties[name].get_decoded_sample(0)
+            with self.assertRaises(ValueError):
+                sample[0] = sample[1]
+        self.assertEqual(
+            archive["/B"].properties["names"].get_decoded_sample(0).tolist(),
+            ["x", "y"],
+        )
+        self.assertEqual(
+            archive["/B"].properties["v"].read_samples().tolist(), [[1, 2]]
+        )
+
+    @unittest.skipIf(not has_numpy, "numpy not available")
+    def test_blender_decoded_sample_cache(self):
+        archive = Archive.from_filename(get_fixture("test_blender_vertexanim.abc"))
+        geom = archive["/Cube/Cube_003"].properties[".geom"]
+        positions = geom["P"].get_decoded_sample(0)
+        self.assertIs(geom[".arbGeomParams"]["Pref"].get_decoded_sample(0), positions)
+        self.assertIs(geom["P"].get_decoded_sample(0), positions)
+        self.assertEqual(archive.sample_cache.hits, 2)
+        self.assertEqual(archive.sample_cache.misses, 1)
+        self.assertEqual(archive.sample_cache.size, positions.nbytes)
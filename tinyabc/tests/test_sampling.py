@@ -0,0 +1,63 @@
+import unittest
+from tinyabc.archive import Archive
+from tinyabc.sampling import (
+    ACYCLIC_TIME_PER_CYCLE,
+    TimeSampling,
+    TimeSamplingException,
+)
+from .utils import get_fixture
+
+
+class TestSampling(unittest.TestCase):
+
+    def test_uniform(self):
+        sampling = TimeSampling(10, 0.5, [1.0])
+        self.assertTrue(sampling.is_uniform())
+        self.assertEqual(sampling.get_sample_time(4), 3.0)
+        self.assertEqual(sampling.get_sample_index(3.0, 10), 4)
+        self.assertEqual(sampling.get_sample_index(3.2, 10), 4)
+        self.assertEqual(sampling.get_sample_index(3.2, 10, "ceil"), 5)
+        self.assertEqual(sampling.get_sample_index(3.2, 10, "nearest"), 4)
+        self.assertEqual(sampling.get_sample_index(3.3, 10, "nearest"), 5)
+        self.assertEqual(sampling.get_sample_index(-5.0, 10, "ceil"), 0)
+        self.assertEqual(sampling.get_sample_index(100.0, 10, "ceil"), 9)
+        self.assertIsNone(sampling.get_sample_index(1.0, 0))
+
+    def test_cyclic(self):
+        sampling = TimeSampling(6, 1.0, [0.0, 0.25])
+        self.assertTrue(sampling.is_cyclic())
+        self.assertEqual(
+            [sampling.get_sample_time(i) for i in range(0, 5)],
+            [0.0, 0.25, 1.0, 1.25, 2.0],
+        )
+        self.assertEqual(sampling.get_sample_index(1.1, 6), 2)
+        self.assertEqual(sampling.get_sample_index(1.1, 6, "ceil"), 3)
+        self.assertEqual(sampling.get_sample_index(1.5, 6, "nearest"), 3)
+        self.assertEqual(sampling.get_sample_index(1.75, 6, "nearest"), 4)
+
+    def test_acyclic(self):
+        sampling = TimeSampling(4, ACYCLIC_TIME_PER_CYCLE, [0.0, 0.1, 0.5, 2.0])
+        self.assertTrue(sampling.is_acyclic())
+        self.assertEqual(sampling.get_sample_time(2), 0.5)
+        self.assertEqual(sampling.get_sample_index(0.4, 4), 1)
+        self.assertEqual(sampling.get_sample_index(0.4, 4, "ceil"), 2)
+        self.assertEqual(sampling.get_sample_index(0.4, 4, "nearest"), 2)
+        self.assertEqual(sampling.get_sample_index(5.0, 4), 3)
+
+    def test_invalid_mode(self):
+        self.assertRaises(
+            TimeSamplingException, TimeSampling().get_sample_index, 0.5, 2, "linear"
+        )
+
+    def test_blender_anim_time_samplings(self):
+        archive = Archive.from_filename(get_fixture("test_blender_anim.abc"))
+        self.assertEqual(len(archive.time_samplings), 2)
+        self.assertEqual(archive.time_samplings[1].max_sample, 6)
+        prop = archive["/MovingNode"].properties[".xform"][".vals"]
+        self.assertIs(prop.time_sampling, archive.time_samplings[1])
+        self.assertAlmostEqual(prop.get_sample_time(3), 0.125)
+        self.assertEqual(prop.get_sample_index_at_time(0.1), 2)
+        self.assertEqual(
+            bytes(prop.get_sample_at_time(0.1, mode="ceil")),
+            bytes(prop.get_sample(3)),
+        )
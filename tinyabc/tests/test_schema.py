@@ -1,7 +1,28 @@
 import unittest
 from tinyabc.archive import Archive
-from tinyabc.schema import AbcGeom_PolyMesh_v1
-from .utils import get_fixture, struct_property_encoder
+from tinyabc.schema import (
+    AbcGeom_Camera_v1,
+    AbcGeom_Curve_v2,
+    AbcGeom_Points_v1,
+    AbcGeom_PolyMesh_v1,
+    AbcGeom_SubD_v1,
+    AbcGeom_Xform_v3,
+    CURVE_BSPLINE_BASIS,
+    CURVE_CUBIC,
+    CURVE_NON_PERIODIC,
+    GEOM_SCOPE_FACE_VARYING,
+    GEOM_SCOPE_VERTEX,
+    GeomParam,
+    SchemaException,
+)
+from tinyabc.sampling import TimeSampling
+from .utils import (
+    clear_sample_digests,
+    get_fixture,
+    struct_property_encoder,
+    write_archive,
+    write_archive_data,
+)
 from tinyabc.encoders import numpy_property
 
 try:
@@ -354,3 +375,419 @@ class TestSchema(unittest.TestCase):
                 ],
             ],
         )
+
+    def test_blender_anim_to_schema(self):
+        archive = Archive.from_filename(get_fixture("test_blender_anim.abc"))
+        xform = archive["/MovingNode"].to_schema()
+        self.assertIsInstance(xform, AbcGeom_Xform_v3)
+        self.assertEqual(xform.get_num_samples(), 6)
+        self.assertEqual(xform.get_ops(3), [48])
+        self.assertTrue(xform.get_inherits(3))
+
+    @unittest.skipIf(not has_numpy, "numpy not available")
+    def test_blender_anim_AbcGeom_Xform_v3(self):
+        archive = Archive.from_filename(get_fixture("test_blender_anim.abc"))
+        xform = archive["/MovingNode"].to_schema()
+        expected = numpy.identity(4)
+        expected[3, 1] = 5.0
+        self.assertEqual(xform.get_matrix(4).tolist(), expected.tolist())
+        # constant transforms hold their only sample
+        child = archive["/MovingNode/Child001"].to_schema()
+        self.assertEqual(child.get_matrix(5)[3].tolist(), [10.0, 0.0, 0.0, 1.0])
+
+    @unittest.skipIf(not has_numpy, "numpy not available")
+    def test_xform_ops(self):
+        def callback(writer):
+            writer.add_object("/Node", schema="AbcGeom_Xform_v3")
+            writer.add_property("/Node", ".xform/.ops", "B", extent=3, array=False)
+            writer.add_property("/Node", ".xform/.vals", "d", extent=7, array=False)
+            # translate, rotate around Z and scale
+            writer.write_sample("/Node", ".xform/.ops", [0x10, 0x60, 0x00])
+            writer.write_sample("/Node", ".xform/.vals", [1, 2, 3, 90, 2, 2, 2])
+
+        xform = write_archive(callback)["/Node"].to_schema()
+        matrix = xform.get_matrix()
+        # points are row vectors, the last operation is applied first
+        point = numpy.array([1.0, 0.0, 0.0, 1.0]) @ matrix
+        self.assertEqual(numpy.round(point, 6).tolist(), [1.0, 4.0, 3.0, 1.0])
+        self.assertTrue(xform.get_inherits())
+
+    @unittest.skipIf(not has_numpy, "numpy not available")
+    def test_xform_rotate(self):
+        def callback(writer):
+            writer.add_object("/Node", schema="AbcGeom_Xform_v3")
+            writer.add_property("/Node", ".xform/.ops", "B", array=False)
+            writer.add_property("/Node", ".xform/.vals", "d", extent=4, array=False)
+            writer.write_sample("/Node", ".xform/.ops", 0x20)
+            writer.write_sample("/Node", ".xform/.vals", [0, 0, 2, 90])
+
+        matrix = write_archive(callback)["/Node"].to_schema().get_matrix()
+        self.assertEqual(
+            numpy.round(numpy.array([0.0, 1.0, 0.0, 1.0]) @ matrix, 6).tolist(),
+            [-1.0, 0.0, 0.0, 1.0],
+        )
+
+    @unittest.skipIf(not has_numpy, "numpy not available")
+    def test_blender_vertex_anim_self_bounds(self):
+        archive = Archive.from_filename(get_fixture("test_blender_vertexanim.abc"))
+        mesh = archive["/Cube/Cube_003"].to_schema()
+        self.assertIsInstance(mesh, AbcGeom_PolyMesh_v1)
+        bounds = mesh.get_self_bounds(10)
+        self.assertEqual(bounds.shape, (6,))
+        positions = mesh.get_P(10, numpy_property).reshape(-1, 3)
+        self.assertTrue(numpy.allclose(bounds[:3], positions.min(axis=0)))
+        self.assertTrue(numpy.allclose(bounds[3:], positions.max(axis=0)))
+        self.assertIsNone(mesh.get_child_bounds())
+        self.assertIsNone(archive["/Cube"].to_schema().get_child_bounds())
+
+    @unittest.skipIf(not has_numpy, "numpy not available")
+    def test_self_bounds_from_positions(self):
+        def callback(writer):
+            writer.add_object("/Mesh", schema="AbcGeom_PolyMesh_v1")
+            writer.add_property("/Mesh", ".geom/P", "f", extent=3)
+            writer.write_sample("/Mesh", ".geom/P", [(0, 1, 2), (-1, 3, 0), (2, 0, 1)])
+            writer.add_object("/Empty", schema="AbcGeom_PolyMesh_v1")
+
+        archive = write_archive(callback)
+        bounds = archive["/Mesh"].to_schema().get_self_bounds()
+        self.assertEqual(bounds.dtype, numpy.float64)
+        self.assertEqual(bounds.tolist(), [-1.0, 0.0, 0.0, 2.0, 3.0, 2.0])
+        # constant properties hold for every sample
+        self.assertEqual(
+            archive["/Mesh"].to_schema().get_self_bounds(5).tolist(), bounds.tolist()
+        )
+        self.assertIsNone(archive["/Empty"].to_schema().get_self_bounds())
+
+    @unittest.skipIf(not has_numpy, "numpy not available")
+    def test_blender_cone_triangulate(self):
+        archive = Archive.from_filename(get_fixture("test_blender_cone.abc"))
+        mesh = archive["/Cone/Mesh"].to_schema()
+        counts = mesh.get_face_counts(0, numpy_property)
+        indices = mesh.get_face_indices(0, numpy_property)
+        triangles = mesh.triangulate()
+        self.assertEqual(triangles.shape, ((counts - 2).sum(), 3))
+        # the 32 sided cap is a fan around its first corner
+        self.assertEqual(counts[30], 32)
+        self.assertEqual(triangles[30:60, 0].tolist(), [indices[90]] * 30)
+        self.assertEqual(triangles[59, 1:].tolist(), indices[120:122].tolist())
+        self.assertEqual(triangles[0].tolist(), indices[:3].tolist())
+        self.assertEqual(triangles[60].tolist(), indices[122:125].tolist())
+        self.assertFalse(triangles.flags.writeable)
+
+    @unittest.skipIf(not has_numpy, "numpy not available")
+    def test_blender_vertex_anim_triangulate_cached(self):
+        archive = Archive.from_filename(get_fixture("test_blender_vertexanim.abc"))
+        mesh = archive["/Cube/Cube_003"].to_schema()
+        # the topology is shared by every frame
+        self.assertIs(mesh.triangulate(1), mesh.triangulate(20))
+
+    @unittest.skipIf(not has_numpy, "numpy not available")
+    def test_blender_cube_vertex_buffer(self):
+        archive = Archive.from_filename(get_fixture("test_blender_cube.abc"))
+        mesh = archive["/Cube/Cube_001"].to_schema()
+        buffer = mesh.get_vertex_buffer()
+        self.assertEqual(buffer.shape, (36, 8))
+        self.assertEqual(buffer.dtype, numpy.float32)
+        positions = mesh.get_P(0, numpy_property).reshape(-1, 3)
+        self.assertEqual(
+            buffer[:, :3].tolist(), positions[mesh.triangulate().ravel()].tolist()
+        )
+        # face varying normals are expanded per triangle corner
+        normals = mesh.get_N(0, numpy_property)
+        self.assertEqual(buffer[:3, 3:6].tolist(), normals[[0, 1, 2]].tolist())
+        self.assertEqual(mesh.get_vertex_buffer(attributes=()).shape, (36, 3))
+        with self.assertRaises(SchemaException):
+            mesh.get_vertex_buffer(attributes=("Cd",))
+
+    @unittest.skipIf(not has_numpy, "numpy not available")
+    def test_vertex_buffer_scopes(self):
+        def callback(writer):
+            writer.add_object("/Mesh", schema="AbcGeom_PolyMesh_v1")
+            writer.add_property("/Mesh", ".geom/P", "f", extent=3)
+            writer.add_property("/Mesh", ".geom/.faceCounts", "i")
+            writer.add_property("/Mesh", ".geom/.faceIndices", "i")
+            writer.write_sample(
+                "/Mesh", ".geom/P", [(0, 0, 0), (1, 0, 0), (1, 1, 0), (0, 1, 0)]
+            )
+            writer.write_sample("/Mesh", ".geom/.faceCounts", [4])
+            writer.write_sample("/Mesh", ".geom/.faceIndices", [0, 1, 2, 3])
+            writer.add_property(
+                "/Mesh", ".geom/weight", "f", metadata={"geoScope": "vtx"}
+            )
+            writer.write_sample("/Mesh", ".geom/weight", [0, 1, 2, 3])
+            writer.add_property("/Mesh", ".geom/id", "f", metadata={"geoScope": "uni"})
+            writer.write_sample("/Mesh", ".geom/id", [7])
+
+        mesh = write_archive(callback)["/Mesh"].to_schema()
+        self.assertEqual(mesh.triangulate().tolist(), [[0, 1, 2], [0, 2, 3]])
+        buffer = mesh.get_vertex_buffer(attributes=("weight", "id"))
+        self.assertEqual(buffer[:, 3].tolist(), [0, 1, 2, 0, 2, 3])
+        self.assertEqual(buffer[:, 4].tolist(), [7] * 6)
+
+    def test_blender_camera(self):
+        archive = Archive.from_filename(
+            get_fixture("test_blender_default_triangulated.abc")
+        )
+        camera = archive["/Camera/Camera"].to_schema()
+        self.assertIsInstance(camera, AbcGeom_Camera_v1)
+        self.assertEqual(camera.get_focal_length(), 50.0)
+        self.assertAlmostEqual(camera.get_film_back()[0], 3.6)
+        self.assertAlmostEqual(camera.get_film_back()[1], 2.4)
+        self.assertAlmostEqual(camera.get_clipping_planes()[0], 0.1)
+        self.assertEqual(camera.get_clipping_planes()[1], 100.0)
+        self.assertAlmostEqual(camera.get_parameters()["shutter_close"], 1 / 48)
+
+    @unittest.skipIf(not has_numpy, "numpy not available")
+    def test_points(self):
+        def callback(writer):
+            writer.add_object("/Points", schema="AbcGeom_Points_v1")
+            writer.add_property("/Points", ".geom/P", "f", extent=3)
+            writer.add_property("/Points", ".geom/.pointIds", "Q")
+            writer.add_property("/Points", ".geom/.velocities", "f", extent=3)
+            writer.add_property("/Points", ".geom/.widths", "f")
+            for frame in range(3):
+                writer.write_sample(
+                    "/Points", ".geom/P", [(frame, 0, 0), (frame, 1, 0)]
+                )
+                writer.write_sample("/Points", ".geom/.pointIds", [10, 11])
+                writer.write_sample(
+                    "/Points", ".geom/.velocities", [(1, 0, 0), (1, 0, 0)]
+                )
+                writer.write_sample("/Points", ".geom/.widths", [0.5, 0.25])
+
+        points = write_archive(callback)["/Points"].to_schema()
+        self.assertIsInstance(points, AbcGeom_Points_v1)
+        # array accessors default to numpy like every other accessor
+        self.assertIsInstance(points.get_P(0), numpy.ndarray)
+        self.assertEqual(points.get_ids(2).tolist(), [10, 11])
+        self.assertEqual(points.get_velocities(1).tolist(), [[1, 0, 0], [1, 0, 0]])
+        self.assertEqual(points.get_widths(2).tolist(), [0.5, 0.25])
+        self.assertEqual(points.get_self_bounds(2).tolist(), [2, 0, 0, 2, 1, 0])
+        # every frame is read in one call
+        positions = points.read_field_samples((".geom", "P"))
+        self.assertEqual(positions.shape, (3, 2, 3))
+        self.assertEqual(positions[:, 0, 0].tolist(), [0, 1, 2])
+
+    @unittest.skipIf(not has_numpy, "numpy not available")
+    def test_curves(self):
+        def callback(writer):
+            writer.add_object("/Hair", schema="AbcGeom_Curve_v2")
+            writer.add_property("/Hair", ".geom/P", "f", extent=3)
+            writer.add_property("/Hair", ".geom/nVertices", "i")
+            writer.add_property(
+                "/Hair", ".geom/curveBasisAndType", "B", extent=4, array=False
+            )
+            writer.write_sample("/Hair", ".geom/P", [(0, 0, 0)] * 7)
+            writer.write_sample("/Hair", ".geom/nVertices", [4, 3])
+            writer.write_sample(
+                "/Hair", ".geom/curveBasisAndType", (CURVE_CUBIC, 0, 2, 1)
+            )
+
+        curves = write_archive(callback)["/Hair"].to_schema()
+        self.assertIsInstance(curves, AbcGeom_Curve_v2)
+        self.assertIsInstance(curves.get_P(), numpy.ndarray)
+        self.assertEqual(curves.get_curve_vertex_counts().tolist(), [4, 3])
+        self.assertEqual(
+            curves.get_basis_and_type(),
+            (CURVE_CUBIC, CURVE_NON_PERIODIC, CURVE_BSPLINE_BASIS),
+        )
+        with self.assertRaises(SchemaException):
+            curves.get_widths()
+
+    @unittest.skipIf(not has_numpy, "numpy not available")
+    def test_subd(self):
+        def callback(writer):
+            writer.add_object("/Cage", schema="AbcGeom_SubD_v1")
+            writer.add_property("/Cage", ".geom/P", "f", extent=3)
+            writer.add_property("/Cage", ".geom/.faceCounts", "i")
+            writer.add_property("/Cage", ".geom/.faceIndices", "i")
+            writer.add_property("/Cage", ".geom/.creaseIndices", "i")
+            writer.add_property("/Cage", ".geom/.creaseLengths", "i")
+            writer.add_property("/Cage", ".geom/.creaseSharpnesses", "f")
+            writer.write_sample("/Cage", ".geom/P", [(0, 0, 0)] * 4)
+            writer.write_sample("/Cage", ".geom/.faceCounts", [4])
+            writer.write_sample("/Cage", ".geom/.faceIndices", [0, 1, 2, 3])
+            writer.write_sample("/Cage", ".geom/.creaseIndices", [0, 1])
+            writer.write_sample("/Cage", ".geom/.creaseLengths", [2])
+            writer.write_sample("/Cage", ".geom/.creaseSharpnesses", [1.5])
+
+        subd = write_archive(callback)["/Cage"].to_schema()
+        self.assertIsInstance(subd, AbcGeom_SubD_v1)
+        self.assertEqual(subd.get_scheme(), "catmull-clark")
+        self.assertEqual(subd.get_crease_indices().tolist(), [0, 1])
+        self.assertEqual(subd.get_crease_lengths().tolist(), [2])
+        self.assertEqual(subd.get_crease_sharpnesses().tolist(), [1.5])
+        self.assertEqual(subd.triangulate().tolist(), [[0, 1, 2], [0, 2, 3]])
+
+    @unittest.skipIf(not has_numpy, "numpy not available")
+    def test_blender_monkey_geom_params(self):
+        archive = Archive.from_filename(get_fixture("test_blender_monkey.abc"))
+        mesh = archive["/Suzanne/Suzanne"].to_schema()
+        uv = mesh.get_geom_param("uv")
+        self.assertIsInstance(uv, GeomParam)
+        self.assertTrue(uv.is_indexed)
+        self.assertEqual(uv.scope, GEOM_SCOPE_FACE_VARYING)
+        expanded = uv.get_expanded()
+        self.assertEqual(expanded.shape, (1968, 2))
+        self.assertEqual(expanded.tolist(), uv.get_vals()[uv.get_indices()].tolist())
+        self.assertIs(uv.get_expanded(), expanded)
+        normals = mesh.get_geom_param("N")
+        self.assertFalse(normals.is_indexed)
+        self.assertIsNone(normals.get_indices())
+        self.assertEqual(normals.get_expanded().shape, (1968, 3))
+        self.assertEqual(mesh.get_arb_geom_params(), {})
+
+    @unittest.skipIf(not has_numpy, "numpy not available")
+    def test_indexed_geom_param_cache(self):
+        def callback(writer):
+            writer.add_object("/Mesh", schema="AbcGeom_PolyMesh_v1")
+            writer.add_compound(
+                "/Mesh", ".geom/.arbGeomParams/Cd", metadata={"geoScope": "vtx"}
+            )
+            writer.add_property("/Mesh", ".geom/.arbGeomParams/Cd/.vals", "f")
+            writer.add_property("/Mesh", ".geom/.arbGeomParams/Cd/.indices", "I")
+            for vals in ([0, 1], [0, 1], [2, 3]):
+                writer.write_sample("/Mesh", ".geom/.arbGeomParams/Cd/.vals", vals)
+                writer.write_sample(
+                    "/Mesh", ".geom/.arbGeomParams/Cd/.indices", [1, 0, 1]
+                )
+
+        mesh = write_archive(callback)["/Mesh"].to_schema()
+        params = mesh.get_arb_geom_params()
+        self.assertEqual(list(params), ["Cd"])
+        color = mesh.get_geom_param("Cd")
+        self.assertEqual(color.scope, GEOM_SCOPE_VERTEX)
+        self.assertEqual(color.num_samples, 3)
+        self.assertEqual(color.get_expanded(0).tolist(), [1, 0, 1])
+        # unchanged samples reuse the same expansion
+        self.assertIs(color.get_expanded(1), color.get_expanded(0))
+        self.assertEqual(color.get_expanded(2).tolist(), [3, 2, 3])
+        with self.assertRaises(SchemaException):
+            mesh.get_geom_param("Alpha")
+
+    @unittest.skipIf(not has_numpy, "numpy not available")
+    def test_geom_params_without_digests(self):
+        def callback(writer):
+            for path, vals, indices in (
+                ("/M1", [1, 2], [1, 0]),
+                ("/M2", [5, 6], [0, 1, 1]),
+            ):
+                writer.add_object(path, schema="AbcGeom_PolyMesh_v1")
+                writer.add_compound(path, ".geom/uv")
+                writer.add_property(path, ".geom/uv/.vals", "f")
+                writer.add_property(path, ".geom/uv/.indices", "I")
+                writer.write_sample(path, ".geom/uv/.vals", vals)
+                writer.write_sample(path, ".geom/uv/.indices", indices)
+
+        archive = Archive.from_buffer(
+            clear_sample_digests(write_archive_data(callback))
+        )
+        uv = archive["/M1"].to_schema().get_geom_param("uv")
+        self.assertIsNone(uv.vals.get_sample_cache_key(0))
+        self.assertEqual(uv.get_expanded().tolist(), [2, 1])
+        self.assertEqual(
+            archive["/M2"].to_schema().get_geom_param("uv").get_expanded().tolist(),
+            [5, 6, 6],
+        )
+        self.assertEqual(len(archive.sample_cache), 0)
+
+    @unittest.skipIf(not has_numpy, "numpy not available")
+    def test_geom_param_without_archive(self):
+        archive = Archive.from_filename(get_fixture("test_blender_cube.abc"))
+        uv = archive["/Cube/Cube_001"].to_schema().get_geom_param("uv")
+        expected = uv.get_expanded().tolist()
+        # properties rebuilt by the parallel workers have no archive
+        uv.vals.archive = None
+        uv.indices.archive = None
+        self.assertEqual(uv.get_expanded().tolist(), expected)
+
+    @unittest.skipIf(not has_numpy, "numpy not available")
+    def test_triangulate_without_digests(self):
+        def callback(writer):
+            for path, counts, indices in (
+                ("/Quad", [4], [0, 1, 2, 3]),
+                ("/Triangles", [3, 3], [3, 2, 1, 1, 0, 3]),
+            ):
+                writer.add_object(path, schema="AbcGeom_PolyMesh_v1")
+                writer.add_property(path, ".geom/.faceCounts", "i")
+                writer.add_property(path, ".geom/.faceIndices", "i")
+                writer.write_sample(path, ".geom/.faceCounts", counts)
+                writer.write_sample(path, ".geom/.faceIndices", indices)
+
+        archive = Archive.from_buffer(
+            clear_sample_digests(write_archive_data(callback))
+        )
+        self.assertEqual(
+            archive["/Quad"].to_schema().triangulate().tolist(),
+            [[0, 1, 2], [0, 2, 3]],
+        )
+        self.assertEqual(
+            archive["/Triangles"].to_schema().triangulate().tolist(),
+            [[3, 2, 1], [1, 0, 3]],
+        )
+        self.assertEqual(len(archive.sample_cache), 0)
+
+    @unittest.skipIf(not has_numpy, "numpy not available")
+    def test_xform_interpolated_matrix(self):
+        def callback(writer):
+            writer.add_object("/Node", schema="AbcGeom_Xform_v3")
+            time_sampling = TimeSampling(time_per_cycle=1 / 24, samples=(0,))
+            writer.add_property(
+                "/Node",
+                ".xform/.ops",
+                "B",
+                extent=2,
+                array=False,
+                time_sampling=time_sampling,
+            )
+            writer.add_property(
+                "/Node",
+                ".xform/.vals",
+                "d",
+                extent=7,
+                array=False,
+                time_sampling=time_sampling,
+            )
+            for vals in ([0, 0, 1, 170, 0, 0, 0], [0, 0, -1, 170, 2, 4, 0]):
+                writer.write_sample("/Node", ".xform/.ops", [0x20, 0x10])
+                writer.write_sample("/Node", ".xform/.vals", vals)
+
+        archive = write_archive(callback)
+        xform = archive["/Node"].to_schema()
+        numpy.testing.assert_allclose(
+            xform.get_interpolated_matrix(0.0), xform.get_matrix(0), atol=1e-9
+        )
+        numpy.testing.assert_allclose(
+            xform.get_interpolated_matrix(1 / 24), xform.get_matrix(1), atol=1e-9
+        )
+        # the rotations are 20 degrees apart across the 180 degrees mark,
+        # translations are blended linearly and applied first
+        matrix = xform.get_interpolated_matrix(1 / 48)
+        numpy.testing.assert_allclose(
+            numpy.array([1.0, 0.0, 0.0, 1.0]) @ matrix,
+            [-2.0, -2.0, 0.0, 1.0],
+            atol=1e-9,
+        )
+        numpy.testing.assert_allclose(
+            archive.world_matrices(1 / 48)[0], matrix, atol=1e-9
+        )
+
+    @unittest.skipIf(not has_numpy, "numpy not available")
+    def test_vertex_buffer_constant_positions(self):
+        def callback(writer):
+            writer.add_object("/Mesh", schema="AbcGeom_PolyMesh_v1")
+            writer.add_property("/Mesh", ".geom/P", "f", extent=3)
+            writer.add_property("/Mesh", ".geom/.faceCounts", "i")
+            writer.add_property("/Mesh", ".geom/.faceIndices", "i")
+            writer.write_sample("/Mesh", ".geom/P", [(0, 0, 0), (1, 0, 0), (0, 1, 0)])
+            for indices in ([0, 1, 2], [2, 1, 0], [0, 1, 2]):
+                writer.write_sample("/Mesh", ".geom/.faceCounts", [3])
+                writer.write_sample("/Mesh", ".geom/.faceIndices", indices)
+
+        mesh = write_archive(callback)["/Mesh"].to_schema()
+        self.assertEqual(mesh.triangulate(2).tolist(), [[0, 1, 2]])
+        # the only positions sample holds for every frame
+        self.assertEqual(
+            mesh.get_vertex_buffer(1, attributes=()).tolist(),
+            [[0, 1, 0], [1, 0, 0], [0, 0, 0]],
+        )
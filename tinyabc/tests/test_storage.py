@@ -0,0 +1,68 @@
+import os.path
+import unittest
+from tinyabc.archive import Archive
+from tinyabc.ogawa import Ogawa
+from tinyabc.storage import CachedStorage, FileStorage, StorageException
+from .utils import CountingStorage, get_fixture, struct_property_encoder
+
+
+class TestStorage(unittest.TestCase):
+
+    def test_file_storage(self):
+        storage = FileStorage.from_filename(get_fixture("test_ogawa_empty.abc"))
+        self.assertEqual(storage.size, 261)
+        self.assertEqual(storage.read(0, 5), b"Ogawa")
+        with self.assertRaises(StorageException):
+            storage.read(260, 10)
+        storage.close()
+        self.assertTrue(storage.handle.closed)
+
+    def test_cached_storage(self):
+        with open(get_fixture("test_blender_monkey.abc"), "rb") as handle:
+            data = handle.read()
+            source = CountingStorage(handle)
+            storage = CachedStorage(source, block_size=256, max_blocks=4)
+            self.assertEqual(bytes(storage.read(100, 10)), data[100:110])
+            self.assertEqual(source.requests, 1)
+            self.assertEqual(source.bytes_read, 256)
+            # the same block is served from the cache
+            self.assertEqual(bytes(storage.read(200, 50)), data[200:250])
+            self.assertEqual(source.requests, 1)
+            # the missing blocks of a range are fetched with a single request
+            self.assertEqual(bytes(storage.read(200, 1000)), data[200:1200])
+            self.assertEqual(source.requests, 2)
+            self.assertEqual(source.bytes_read, 1280)
+            self.assertEqual(storage.misses, 5)
+            # only the most recently used blocks are kept
+            self.assertEqual(len(storage._blocks), 4)
+            self.assertEqual(bytes(storage.read(0, 10)), data[0:10])
+            self.assertEqual(source.requests, 3)
+            self.assertEqual(bytes(storage.read(len(data) - 10, 10)), data[-10:])
+            self.assertEqual(bytes(storage.read(0, 0)), b"")
+
+    def test_ogawa_from_storage(self):
+        filename = get_fixture("test_ogawa_empty.abc")
+        ogawa = Ogawa.from_storage(FileStorage.from_filename(filename))
+        self.assertEqual(ogawa.magic, b"Ogawa")
+        self.assertEqual(ogawa.wflag, 0xFF)
+        self.assertEqual(ogawa.version, (0, 1))
+        self.assertEqual(
+            ogawa.totree(bytes), Ogawa.from_filename(filename).totree(bytes)
+        )
+        ogawa.close()
+
+    def test_archive_partial_read(self):
+        filename = get_fixture("test_blender_monkey.abc")
+        with open(filename, "rb") as handle:
+            source = CountingStorage(handle)
+            archive = Archive.from_storage(CachedStorage(source, block_size=512))
+            faces = archive["/Suzanne/Suzanne"].properties[".geom"][".faceCounts"]
+            expected = Archive.from_filename(filename)["/Suzanne/Suzanne"].properties[
+                ".geom"
+            ][".faceCounts"]
+            self.assertEqual(
+                struct_property_encoder(faces), struct_property_encoder(expected)
+            )
+            # the points, normals and uvs of the mesh are never read
+            self.assertLess(source.bytes_read, os.path.getsize(filename) // 4)
+            self.assertLess(source.requests, 16)
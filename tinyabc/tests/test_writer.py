@@ -0,0 +1,283 @@
+import io
+import os.path
+import struct
+import tempfile
+import unittest
+from tinyabc.archive import Archive
+from tinyabc.sampling import TimeSampling
+from tinyabc.writer import ArchiveWriter, ArchiveWriterException
+from .utils import struct_property_encoder, write_archive
+
+try:
+    import numpy
+
+    has_numpy = True
+except ImportError:
+    has_numpy = False
+
+
+class TestWriter(unittest.TestCase):
+
+    def test_empty(self):
+        archive = write_archive(lambda writer: None)
+        self.assertEqual(archive.metadata, {"_ai_Application": "tinyabc"})
+        self.assertEqual(archive.root.children, [])
+        self.assertEqual(len(archive.time_samplings), 1)
+
+    def test_objects(self):
+        def callback(writer):
+            writer.add_object("/Node", schema="AbcGeom_Xform_v3")
+            writer.add_object("/Node/Child", metadata={"key": "value"})
+            writer.add_object("/Other")
+
+        archive = write_archive(callback)
+        self.assertEqual(archive.paths(), ["/Node", "/Node/Child", "/Other"])
+        self.assertEqual(archive["/Node"].metadata, {"schema": "AbcGeom_Xform_v3"})
+        self.assertEqual(archive["/Node/Child"].metadata, {"key": "value"})
+        self.assertEqual(archive["/Other"].metadata, {})
+
+    def test_inline_metadata(self):
+        def callback(writer):
+            writer.add_object("/Node", metadata={"key": "x" * 300})
+            writer.add_property("/Node", "prop", "i", metadata={"key": "y" * 300})
+            writer.write_sample("/Node", "prop", [1])
+
+        archive = write_archive(callback)
+        self.assertEqual(archive["/Node"].metadata, {"key": "x" * 300})
+        self.assertEqual(
+            archive["/Node"].properties["prop"].metadata, {"key": "y" * 300}
+        )
+
+    def test_invalid_paths(self):
+        writer = ArchiveWriter(io.BytesIO())
+        with self.assertRaises(ArchiveWriterException):
+            writer.add_object("Node")
+        with self.assertRaises(KeyError):
+            writer.add_object("/Missing/Node")
+        writer.add_object("/Node")
+        with self.assertRaises(ArchiveWriterException):
+            writer.add_object("/Node")
+        writer.add_property("/Node", "prop", "f")
+        with self.assertRaises(ArchiveWriterException):
+            writer.add_property("/Node", "prop", "f")
+        with self.assertRaises(ArchiveWriterException):
+            writer.add_property("/Node", "other", "x")
+
+    def test_scalar_properties(self):
+        def callback(writer):
+            writer.add_object("/Node")
+            writer.add_property("/Node", ".xform/.inherits", "?", array=False)
+            writer.add_property("/Node", ".xform/.vals", "d", extent=3, array=False)
+            for i in range(3):
+                writer.write_sample("/Node", ".xform/.inherits", True)
+                writer.write_sample("/Node", (".xform", ".vals"), (i, i + 1, i + 2))
+
+        archive = write_archive(callback)
+        tree = archive["/Node"].properties.totree(encoder=struct_property_encoder)
+        self.assertEqual(tree[".xform"][".inherits"], [True, True, True])
+        self.assertEqual(
+            tree[".xform"][".vals"], [(0.0, 1.0, 2.0), (1.0, 2.0, 3.0), (2.0, 3.0, 4.0)]
+        )
+
+    def test_array_properties(self):
+        def callback(writer):
+            writer.add_object("/Mesh")
+            writer.add_compound("/Mesh", ".geom", metadata={"schema": "Geom"})
+            writer.add_property("/Mesh", ".geom/P", "f", extent=3)
+            writer.add_property("/Mesh", ".geom/.faceCounts", "i")
+            writer.write_sample("/Mesh", ".geom/P", [(0, 0, 0), (1, 0, 0), (0, 1, 0)])
+            writer.write_sample("/Mesh", ".geom/P", [(0, 0, 1), (1, 0, 1)])
+            writer.write_sample("/Mesh", ".geom/.faceCounts", [3])
+
+        archive = write_archive(callback)
+        geom = archive["/Mesh"].properties[".geom"]
+        self.assertEqual(geom.metadata, {"schema": "Geom"})
+        self.assertEqual(geom["P"].num_samples, 2)
+        self.assertEqual(geom["P"].dims, [(3,), (2,)])
+        tree = geom.totree(encoder=struct_property_encoder)
+        self.assertEqual(
+            tree["P"],
+            [
+                [(0.0, 0.0, 0.0), (1.0, 0.0, 0.0), (0.0, 1.0, 0.0)],
+                [(0.0, 0.0, 1.0), (1.0, 0.0, 1.0)],
+            ],
+        )
+        self.assertEqual(tree[".faceCounts"], [[3]])
+
+    def test_string_properties(self):
+        def callback(writer):
+            writer.add_object("/Node")
+            writer.add_property("/Node", "names", "string")
+            writer.add_property("/Node", "wnames", "wstring")
+            writer.add_property("/Node", "name", "string", array=False)
+            writer.write_sample("/Node", "names", ["hello", "", "world"])
+            writer.write_sample("/Node", "wnames", ["ciao"])
+            writer.write_sample("/Node", "name", "tinyabc")
+
+        archive = write_archive(callback)
+        names = archive["/Node"].properties["names"]
+        self.assertEqual(names.dims, [(3,)])
+        self.assertEqual(struct_property_encoder(names), [["hello", "", "world"]])
+        self.assertEqual(
+            bytes(archive["/Node"].properties["wnames"].get_sample(0)),
+            "ciao\x00".encode("utf-32-le"),
+        )
+        self.assertEqual(
+            bytes(archive["/Node"].properties["name"].get_sample(0)), b"tinyabc\x00"
+        )
+
+    def test_dims(self):
+        def callback(writer):
+            writer.add_object("/Node")
+            writer.add_property("/Node", "grid", "B")
+            writer.write_sample("/Node", "grid", bytes(range(6)), dims=(2, 3))
+            with self.assertRaises(ArchiveWriterException):
+                writer.write_sample("/Node", "grid", bytes(range(6)), dims=(4, 2))
+
+        archive = write_archive(callback)
+        self.assertEqual(archive["/Node"].properties["grid"].dims, [(2, 3)])
+
+    def test_time_sampling(self):
+        def callback(writer):
+            writer.add_object("/Node")
+            writer.add_property(
+                "/Node",
+                "value",
+                "i",
+                array=False,
+                time_sampling=TimeSampling(time_per_cycle=1 / 24, samples=(1 / 24,)),
+            )
+            for i in range(5):
+                writer.write_sample("/Node", "value", i)
+
+        archive = write_archive(callback)
+        self.assertEqual(len(archive.time_samplings), 2)
+        self.assertEqual(archive.time_samplings[1].max_sample, 5)
+        prop = archive["/Node"].properties["value"]
+        self.assertEqual(prop.time_sampling, archive.time_samplings[1])
+        self.assertAlmostEqual(prop.get_sample_time(2), 3 / 24)
+        self.assertEqual(struct.unpack("<i", prop.get_sample_at_time(3 / 24)), (2,))
+
+    def test_deduplicate_samples(self):
+        def write(optimize):
+            handle = io.BytesIO()
+            writer = ArchiveWriter(handle, optimize=optimize)
+            writer.add_object("/Node")
+            writer.add_property("/Node", "data", "B")
+            for i in range(10):
+                writer.write_sample("/Node", "data", bytes([i % 2]) * 1000)
+            writer.close()
+            return handle.getvalue()
+
+        optimized = write(True)
+        self.assertLess(len(optimized), len(write(False)) - 8000)
+        prop = Archive.from_buffer(optimized)["/Node"].properties["data"]
+        self.assertEqual(prop.num_samples, 10)
+        self.assertEqual(bytes(prop.get_sample(9)), bytes([1]) * 1000)
+
+    def test_constant_samples(self):
+        def callback(writer):
+            writer.add_object("/Node")
+            writer.add_property("/Node", "static", "d", extent=3, array=False)
+            writer.add_property("/Node", "points", "f")
+            for i in range(10):
+                writer.write_sample("/Node", "static", (1, 2, 3))
+                writer.write_sample("/Node", "points", [0.0, 1.0])
+
+        archive = write_archive(callback)
+        for name in ("static", "points"):
+            prop = archive["/Node"].properties[name]
+            self.assertEqual(prop.num_samples, 10)
+            self.assertEqual(prop.first_changed_index, 0)
+            self.assertEqual(prop.last_changed_index, 0)
+            self.assertEqual(len(prop.node), 1 if name == "static" else 2)
+            self.assertEqual(prop.get_sample(9), prop.get_sample(0))
+
+    def test_changed_samples(self):
+        values = [0, 0, 0, 1, 1, 2, 3, 3, 3, 3]
+
+        def callback(writer):
+            writer.add_object("/Node")
+            writer.add_property("/Node", "scalar", "i", array=False)
+            writer.add_property("/Node", "array", "i")
+            for value in values:
+                writer.write_sample("/Node", "scalar", value)
+                writer.write_sample("/Node", "array", [value] * (value + 1))
+
+        archive = write_archive(callback)
+        scalar = archive["/Node"].properties["scalar"]
+        self.assertEqual(scalar.first_changed_index, 3)
+        self.assertEqual(scalar.last_changed_index, 6)
+        # the first sample, the changes and the repeat between them
+        self.assertEqual(len(scalar.node), 5)
+        tree = archive["/Node"].properties.totree(encoder=struct_property_encoder)
+        self.assertEqual(tree["scalar"], values)
+        self.assertEqual(tree["array"], [[value] * (value + 1) for value in values])
+
+    def test_changed_dims(self):
+        def callback(writer):
+            writer.add_object("/Node")
+            writer.add_property("/Node", "grid", "B")
+            writer.write_sample("/Node", "grid", bytes(6), dims=(2, 3))
+            writer.write_sample("/Node", "grid", bytes(6), dims=(3, 2))
+
+        archive = write_archive(callback)
+        self.assertEqual(archive["/Node"].properties["grid"].dims, [(2, 3), (3, 2)])
+
+    def test_from_filename(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "test.abc")
+            with ArchiveWriter.from_filename(filename) as writer:
+                writer.add_object("/Node")
+            with Archive.from_filename(filename) as archive:
+                self.assertEqual(archive.paths(), ["/Node"])
+
+    @unittest.skipIf(not has_numpy, "numpy not available")
+    def test_numpy_round_trip(self):
+        points = numpy.arange(30, dtype=numpy.float32).reshape(10, 3)
+
+        def callback(writer):
+            writer.add_object("/Mesh")
+            writer.add_property("/Mesh", "P", "f", extent=3)
+            for i in range(4):
+                writer.write_sample("/Mesh", "P", points + i)
+            writer.add_property("/Mesh", "ragged", "i")
+            writer.write_sample("/Mesh", "ragged", numpy.arange(3, dtype=numpy.int32))
+            writer.write_sample("/Mesh", "ragged", numpy.arange(2, dtype=numpy.int32))
+
+        archive = write_archive(callback)
+        samples = archive["/Mesh"].properties["P"].read_samples()
+        self.assertEqual(samples.shape, (4, 10, 3))
+        self.assertEqual(samples[3].tolist(), (points + 3).tolist())
+        values, offsets = archive["/Mesh"].properties["ragged"].read_samples()
+        self.assertEqual(values.tolist(), [0, 1, 2, 0, 1])
+        self.assertEqual(offsets.tolist(), [0, 3, 5])
+
+        with self.assertRaises(ArchiveWriterException):
+            ArchiveWriter(io.BytesIO()).add_property("/", "P", "f").write_sample(
+                points[:, 0]
+            )
+
+    @unittest.skipIf(not has_numpy, "numpy not available")
+    def test_numpy_format_mismatch(self):
+        def callback(writer):
+            writer.add_object("/Mesh")
+            writer.add_property("/Mesh", ".geom/P", "f", extent=3)
+            writer.add_property("/Mesh", ".geom/.faceIndices", "i")
+            writer.add_property("/Mesh", "ids", "Q")
+            with self.assertRaises(ArchiveWriterException):
+                writer.write_sample(
+                    "/Mesh",
+                    ".geom/P",
+                    numpy.array([[0, 1, 2], [3, 4, 5]], dtype=numpy.float64),
+                )
+            with self.assertRaises(ArchiveWriterException):
+                writer.write_sample("/Mesh", ".geom/.faceIndices", numpy.arange(3))
+            # explicit little endian and native codes of the same size match
+            writer.write_sample("/Mesh", ".geom/P", numpy.zeros((2, 3), dtype="<f4"))
+            writer.write_sample("/Mesh", "ids", numpy.arange(3, dtype=numpy.uint64))
+
+        archive = write_archive(callback)
+        properties = archive["/Mesh"].properties
+        self.assertEqual(properties[".geom"]["P"].num_samples, 1)
+        self.assertEqual(properties["ids"].get_decoded_sample(0).tolist(), [0, 1, 2])
@@ -1,6 +1,8 @@
+import io
 import os.path
 import struct
 from tinyabc.properties import ScalarProperty
+from tinyabc.storage import FileStorage
 import math
 
 
@@ -8,6 +10,35 @@ def get_fixture(name):
     return os.path.join(os.path.dirname(__file__), "fixtures", name)
 
 
+def write_archive_data(callback, **kwargs):
+    from tinyabc.writer import ArchiveWriter
+
+    handle = io.BytesIO()
+    writer = ArchiveWriter(handle, **kwargs)
+    callback(writer)
+    writer.close()
+    return handle.getvalue()
+
+
+def write_archive(callback, **kwargs):
+    from tinyabc.archive import Archive
+
+    return Archive.from_buffer(write_archive_data(callback, **kwargs))
+
+
+class CountingStorage(FileStorage):
+    # stands in for remote storage, every request is counted
+    def __init__(self, handle):
+        super().__init__(handle)
+        self.requests = 0
+        self.bytes_read = 0
+
+    def read(self, offset, size):
+        self.requests += 1
+        self.bytes_read += size
+        return super().read(offset, size)
+
+
 def struct_property_encoder(prop):
     if isinstance(prop, ScalarProperty):
         return [
@@ -52,3 +83,25 @@ def struct_property_encoder(prop):
             samples.append(items)
 
         return samples
+
+
+def clear_sample_digests(data):
+    # like hand built trees, every sample ends up with an all zero digest
+    from tinyabc.archive import Archive
+    from tinyabc.properties import CompoundProperty
+
+    data = bytearray(data)
+    archive = Archive.from_buffer(bytes(data))
+
+    def _clear(compound):
+        for prop in compound.children:
+            if isinstance(prop, CompoundProperty):
+                _clear(prop)
+                continue
+            prop._setup()
+            for sample in prop._samples:
+                data[sample.offset + 8 : sample.offset + 24] = bytes(16)
+
+    for path in archive.paths():
+        _clear(archive[path].properties)
+    return bytes(data)
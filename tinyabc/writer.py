@@ -0,0 +1,506 @@
+import hashlib
+import math
+import struct
+import sys
+from .metadata import serialize_metadata
+from .ogawa import OgawaWriter
+from .properties import POD_TYPE_FORMATS
+from .sampling import TimeSampling
+
+ARCHIVE_VERSION = 0
+LIBRARY_VERSION = 10808
+
+SIZE_HINT_FORMATS = ("<B", "<H", "<I")
+
+
+class ArchiveWriterException(Exception):
+    pass
+
+
+def _get_size_hint(values):
+    largest = max(values)
+    if largest < 0x100:
+        return 0
+    if largest < 0x10000:
+        return 1
+    return 2
+
+
+def _flatten(values):
+    if isinstance(values, (list, tuple)):
+        for value in values:
+            yield from _flatten(value)
+    else:
+        yield values
+
+
+def _get_format_key(buffer_format):
+    # numpy reports native codes (int64 is "l" on most platforms), so formats
+    # are compared by kind and size, little endian and native are equivalent
+    code = buffer_format.lstrip("<>=!@")
+    if len(code) != 1:
+        return None
+    byte_order = buffer_format[0] if len(buffer_format) > 1 else "@"
+    if byte_order in ">!" or (byte_order in "=@" and sys.byteorder != "little"):
+        return None
+    try:
+        size = struct.calcsize(code if byte_order == "@" else "<" + code)
+    except struct.error:
+        return None
+    if code == "?":
+        return "bool", size
+    if code in "efd":
+        return "float", size
+    return ("signed" if code.islower() else "unsigned"), size
+
+
+def _digest(*chunks):
+    hasher = hashlib.blake2b(digest_size=16)
+    for chunk in chunks:
+        hasher.update(chunk)
+    return hasher.digest()
+
+
+class PropertyWriter:
+    def __init__(
+        self,
+        writer,
+        name,
+        pod_type_format,
+        extent,
+        is_array,
+        time_sampling_index,
+        metadata,
+    ):
+        if pod_type_format not in POD_TYPE_FORMATS:
+            raise ArchiveWriterException(
+                "Unsupported pod type: {}".format(pod_type_format)
+            )
+        if extent < 1 or extent > 0xFF:
+            raise ArchiveWriterException("Invalid extent: {}".format(extent))
+        self.writer = writer
+        self.name = name
+        self.pod_type_format = pod_type_format
+        self.extent = extent
+        self.is_array = is_array
+        self.time_sampling_index = time_sampling_index
+        self.metadata = metadata
+        self.num_samples = 0
+        # Ogawa headers of the stored samples (interleaved with dims for arrays)
+        self._headers = []
+        self.first_changed_index = 0
+        self.last_changed_index = 0
+        self._previous_key = None
+        self._num_elements = None
+        self._homogenous = True
+        self._scalar_like = True
+        self._hasher = hashlib.blake2b(digest_size=16)
+
+    def get_pod_size(self):
+        if self.pod_type_format not in ("string", "wstring"):
+            return struct.calcsize(self.pod_type_format) * self.extent
+        raise ArchiveWriterException(
+            "Unsupported pod type: {}".format(self.pod_type_format)
+        )
+
+    def _encode(self, data):
+        if self.pod_type_format in ("string", "wstring"):
+            strings = [data] if isinstance(data, str) else list(data)
+            if self.pod_type_format == "string":
+                payload = b"".join(
+                    string.encode(self.writer.encoding) + b"\x00" for string in strings
+                )
+            else:
+                payload = b"".join(
+                    string.encode("utf-32-le") + b"\x00\x00\x00\x00"
+                    for string in strings
+                )
+            return payload, len(strings) // (1 if self.is_array else self.extent)
+
+        try:
+            view = memoryview(data)
+            if _get_format_key(view.format) != _get_format_key(self.pod_type_format):
+                raise ArchiveWriterException(
+                    "Sample format {} does not match {} of {}".format(
+                        view.format, self.pod_type_format, self.name
+                    )
+                )
+        except TypeError:
+            values = list(_flatten(data))
+            view = memoryview(
+                struct.pack("<{}{}".format(len(values), self.pod_type_format), *values)
+            )
+        if not view.c_contiguous:
+            raise ArchiveWriterException("Sample data has to be contiguous")
+        # numpy arrays (and any other buffer) are written without copies
+        view = view.cast("B")
+        pod_size = self.get_pod_size()
+        if view.nbytes % pod_size:
+            raise ArchiveWriterException(
+                "Sample size {} is not a multiple of {}".format(view.nbytes, pod_size)
+            )
+        return view, view.nbytes // pod_size
+
+    def write_sample(self, data, dims=None):
+        payload, num_elements = self._encode(data)
+
+        if not self.is_array and num_elements != 1:
+            raise ArchiveWriterException(
+                "Scalar property {} expects a single element".format(self.name)
+            )
+
+        dims_data = None
+        if self.is_array:
+            dims = tuple(dims) if dims is not None else (num_elements,)
+            if math.prod(dims) != num_elements:
+                raise ArchiveWriterException(
+                    "Dims {} do not match {} elements".format(dims, num_elements)
+                )
+            # rank 1 dims of non string types are derived from the sample size
+            if len(dims) == 1 and self.pod_type_format not in ("string", "wstring"):
+                dims_data = b""
+            else:
+                dims_data = struct.pack("<{}Q".format(len(dims)), *dims)
+
+        digest = _digest(payload)
+        key = (digest, dims_data)
+        sample_index = self.num_samples
+        self.num_samples += 1
+        self.writer._update_max_sample(self.time_sampling_index, self.num_samples)
+
+        # repeated samples are not stored, the reader maps them back
+        # to the previous sample using the first and last changed indices
+        if sample_index > 0 and key == self._previous_key:
+            return
+        self._previous_key = key
+
+        headers_per_sample = 2 if self.is_array else 1
+        if sample_index > 0:
+            if self.first_changed_index == 0:
+                self.first_changed_index = sample_index
+            else:
+                # repeats between two changes still need a stored sample,
+                # they reference the data already written
+                previous_headers = self._headers[-headers_per_sample:]
+                for _ in range(self.last_changed_index + 1, sample_index):
+                    self._headers += previous_headers
+            self.last_changed_index = sample_index
+
+        self._hasher.update(digest)
+        ogawa = self.writer._ogawa
+        self._headers.append(ogawa.write_data((digest, payload), key=digest))
+
+        if self.is_array:
+            self._headers.append(ogawa.write_data(dims_data))
+            if self._num_elements is None:
+                self._num_elements = num_elements
+            elif self._num_elements != num_elements:
+                self._homogenous = False
+            if num_elements != 1:
+                self._scalar_like = False
+
+    def _get_header(self):
+        metadata_index, metadata_blob = self.writer._get_metadata_index(self.metadata)
+        name = self.name.encode(self.writer.encoding)
+        first_changed_index = self.first_changed_index
+        last_changed_index = self.last_changed_index
+
+        values = [
+            self.num_samples,
+            first_changed_index,
+            last_changed_index,
+            self.time_sampling_index,
+            len(name),
+            len(metadata_blob),
+        ]
+        size_hint = _get_size_hint(values)
+        size_hint_format = SIZE_HINT_FORMATS[size_hint]
+
+        if not self.is_array:
+            property_type = 1
+        elif self._scalar_like and self.num_samples > 0:
+            property_type = 3
+        else:
+            property_type = 2
+
+        info = (
+            property_type
+            | (size_hint << 2)
+            | (POD_TYPE_FORMATS.index(self.pod_type_format) << 4)
+            | (self.extent << 12)
+            | (metadata_index << 20)
+        )
+
+        has_first_and_last_changed_index = False
+        if first_changed_index == 0 and last_changed_index == 0:
+            info |= 1 << 11
+        elif first_changed_index != 1 or last_changed_index != self.num_samples - 1:
+            info |= 1 << 9
+            has_first_and_last_changed_index = True
+        if self.time_sampling_index:
+            info |= 1 << 8
+        if self._homogenous:
+            info |= 1 << 10
+
+        header = struct.pack("<I", info)
+        header += struct.pack(size_hint_format, self.num_samples)
+        if has_first_and_last_changed_index:
+            header += struct.pack(size_hint_format, first_changed_index)
+            header += struct.pack(size_hint_format, last_changed_index)
+        if self.time_sampling_index:
+            header += struct.pack(size_hint_format, self.time_sampling_index)
+        header += struct.pack(size_hint_format, len(name)) + name
+        if metadata_index == 0xFF:
+            header += struct.pack(size_hint_format, len(metadata_blob))
+            header += metadata_blob
+        return header
+
+    def _close(self):
+        return self.writer._ogawa.write_group(self._headers), self._hasher.digest()
+
+
+class CompoundPropertyWriter:
+    def __init__(self, writer, name, metadata):
+        self.writer = writer
+        self.name = name
+        self.metadata = metadata
+        self.children = {}
+
+    def __getitem__(self, key):
+        return self.children[key]
+
+    def _get_header(self):
+        metadata_index, metadata_blob = self.writer._get_metadata_index(self.metadata)
+        name = self.name.encode(self.writer.encoding)
+        size_hint = _get_size_hint([len(name), len(metadata_blob)])
+        size_hint_format = SIZE_HINT_FORMATS[size_hint]
+        header = struct.pack("<I", (size_hint << 2) | (metadata_index << 20))
+        header += struct.pack(size_hint_format, len(name)) + name
+        if metadata_index == 0xFF:
+            header += struct.pack(size_hint_format, len(metadata_blob))
+            header += metadata_blob
+        return header
+
+    def _close(self):
+        ogawa = self.writer._ogawa
+        if not self.children:
+            return ogawa.write_group([]), _digest()
+        headers = []
+        headers_blob = bytearray()
+        digests = []
+        for child in self.children.values():
+            header, digest = child._close()
+            headers.append(header)
+            digests.append(digest)
+            headers_blob += child._get_header()
+        headers.append(ogawa.write_data(headers_blob))
+        return ogawa.write_group(headers), _digest(headers_blob, *digests)
+
+
+class ObjectWriter:
+    def __init__(self, writer, parent, name, metadata):
+        self.writer = writer
+        self.parent = parent
+        self.name = name
+        self.metadata = metadata
+        self.children = {}
+        self.properties = CompoundPropertyWriter(writer, "", {})
+
+    def __getitem__(self, key):
+        return self.children[key]
+
+    def _close(self):
+        ogawa = self.writer._ogawa
+        properties_header, data_digest = self.properties._close()
+        headers = [properties_header]
+        headers_blob = bytearray()
+        child_digests = []
+        for child in self.children.values():
+            child_header, child_digest = child._close()
+            headers.append(child_header)
+            child_digests.append(child_digest)
+            name = child.name.encode(self.writer.encoding)
+            metadata_index, metadata_blob = self.writer._get_metadata_index(
+                child.metadata
+            )
+            headers_blob += struct.pack("<I", len(name)) + name
+            headers_blob += struct.pack("<B", metadata_index)
+            if metadata_index == 0xFF:
+                headers_blob += struct.pack("<I", len(metadata_blob)) + metadata_blob
+        # object headers end with the digests of the properties and children
+        children_digest = _digest(headers_blob, *child_digests)
+        headers_blob += data_digest + children_digest
+        headers.append(ogawa.write_data(headers_blob))
+        return ogawa.write_group(headers), _digest(data_digest, children_digest)
+
+
+class ArchiveWriter:
+    def __init__(self, handle, metadata=None, encoding="utf8", optimize=True):
+        self.encoding = encoding
+        self.metadata = (
+            metadata if metadata is not None else {"_ai_Application": "tinyabc"}
+        )
+        self.time_samplings = [TimeSampling()]
+        self.root = ObjectWriter(self, None, "ABC", self.metadata)
+        self._ogawa = OgawaWriter(handle, optimize=optimize)
+        self._handle = None
+        self._max_samples = [0]
+        self._indexed_metadata = {}
+        self._closed = False
+
+    @staticmethod
+    def from_filename(filename, metadata=None, encoding="utf8", optimize=True):
+        handle = open(filename, "wb")
+        writer = ArchiveWriter(handle, metadata, encoding, optimize)
+        writer._handle = handle
+        return writer
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        elif self._handle:
+            self._handle.close()
+
+    def __getitem__(self, key):
+        return self.get_object(key)
+
+    def get_object(self, path):
+        if not path.startswith("/"):
+            raise ArchiveWriterException("Object path has to start with a /")
+        item = self.root
+        for part in path.split("/")[1:]:
+            if part:
+                item = item[part]
+        return item
+
+    def add_time_sampling(self, time_sampling):
+        for i, existing in enumerate(self.time_samplings):
+            if (existing.time_per_cycle, existing.samples) == (
+                time_sampling.time_per_cycle,
+                time_sampling.samples,
+            ):
+                return i
+        self.time_samplings.append(time_sampling)
+        self._max_samples.append(0)
+        return len(self.time_samplings) - 1
+
+    def add_object(self, path, schema=None, metadata=None):
+        if not path.startswith("/"):
+            raise ArchiveWriterException("Object path has to start with a /")
+        parent_path, name = path.rsplit("/", 1)
+        parent = self.get_object(parent_path or "/")
+        if not name or name in parent.children:
+            raise ArchiveWriterException("Invalid object path: {}".format(path))
+        metadata = dict(metadata) if metadata else {}
+        if schema:
+            metadata["schema"] = schema
+        parent.children[name] = ObjectWriter(self, parent, name, metadata)
+        return parent.children[name]
+
+    def _get_parent_compound(self, object_path, property_path):
+        if isinstance(property_path, str):
+            property_path = property_path.split("/")
+        compound = self.get_object(object_path).properties
+        for part in property_path[:-1]:
+            if part not in compound.children:
+                compound.children[part] = CompoundPropertyWriter(self, part, {})
+            compound = compound.children[part]
+            if not isinstance(compound, CompoundPropertyWriter):
+                raise ArchiveWriterException("{} is not a compound".format(part))
+        name = property_path[-1]
+        if name in compound.children:
+            raise ArchiveWriterException("Property {} already exists".format(name))
+        return compound, name
+
+    def add_compound(self, object_path, property_path, metadata=None):
+        compound, name = self._get_parent_compound(object_path, property_path)
+        compound.children[name] = CompoundPropertyWriter(self, name, metadata or {})
+        return compound.children[name]
+
+    def add_property(
+        self,
+        object_path,
+        property_path,
+        pod_type_format,
+        extent=1,
+        array=True,
+        time_sampling=0,
+        metadata=None,
+    ):
+        if isinstance(time_sampling, TimeSampling):
+            time_sampling = self.add_time_sampling(time_sampling)
+        if time_sampling >= len(self.time_samplings):
+            raise ArchiveWriterException(
+                "Invalid time sampling index: {}".format(time_sampling)
+            )
+        compound, name = self._get_parent_compound(object_path, property_path)
+        compound.children[name] = PropertyWriter(
+            self, name, pod_type_format, extent, array, time_sampling, metadata or {}
+        )
+        return compound.children[name]
+
+    def get_property(self, object_path, property_path):
+        if isinstance(property_path, str):
+            property_path = property_path.split("/")
+        item = self.get_object(object_path).properties
+        for part in property_path:
+            item = item[part]
+        return item
+
+    def write_sample(self, object_path, property_path, data, dims=None):
+        self.get_property(object_path, property_path).write_sample(data, dims)
+
+    def _update_max_sample(self, time_sampling_index, num_samples):
+        if num_samples > self._max_samples[time_sampling_index]:
+            self._max_samples[time_sampling_index] = num_samples
+
+    def _get_metadata_index(self, metadata):
+        blob = serialize_metadata(metadata, self.encoding)
+        if not blob:
+            return 0, blob
+        if blob in self._indexed_metadata:
+            return self._indexed_metadata[blob], blob
+        # index 0 is the empty metadata and 0xff marks inline metadata
+        if len(blob) < 0x100 and len(self._indexed_metadata) < 0xFE:
+            self._indexed_metadata[blob] = len(self._indexed_metadata) + 1
+            return self._indexed_metadata[blob], blob
+        return 0xFF, blob
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+
+        ogawa = self._ogawa
+        root_object_header, _ = self.root._close()
+
+        time_samplings_blob = bytearray()
+        for time_sampling, max_sample in zip(self.time_samplings, self._max_samples):
+            time_samplings_blob += struct.pack(
+                "<IdI{}d".format(len(time_sampling.samples)),
+                max_sample,
+                time_sampling.time_per_cycle,
+                len(time_sampling.samples),
+                *time_sampling.samples
+            )
+
+        indexed_metadata_blob = bytearray()
+        for blob in self._indexed_metadata:
+            indexed_metadata_blob += struct.pack("<B", len(blob)) + blob
+
+        ogawa.close(
+            [
+                ogawa.write_data(struct.pack("<I", ARCHIVE_VERSION)),
+                ogawa.write_data(struct.pack("<I", LIBRARY_VERSION)),
+                root_object_header,
+                ogawa.write_data(serialize_metadata(self.metadata, self.encoding)),
+                ogawa.write_data(time_samplings_blob),
+                ogawa.write_data(indexed_metadata_blob),
+            ]
+        )
+
+        if self._handle:
+            self._handle.close()